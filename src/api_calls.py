@@ -0,0 +1,83 @@
+import requests
+from rate_limiter import call_with_backoff, call_with_backoff_async, estimate_chat_tokens
+from response_cache import cache
+from telemetry import telemetry
+
+# Every outbound call in the pipeline goes through the helpers below, so caching, rate
+# limiting, retries and telemetry live in exactly one place. A cache hit never touches the
+# network, but is still recorded as a (zero-cost) span.
+
+# Token counts reported by the API, for the cost estimate
+def _record_usage(span, response):
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        span["prompt_tokens"] = getattr(usage, "prompt_tokens", 0) or 0
+        span["completion_tokens"] = getattr(usage, "completion_tokens", 0) or 0
+
+# --- 1. OpenAI chat completions (return the message content) ---
+def chat_completion(client, **params):
+    with telemetry.span("openai", model=params.get("model")) as span:
+        cached = cache.get("openai", params)
+        if cached is not None:
+            span["cache_hit"] = True
+            return cached
+        tokens = estimate_chat_tokens(params.get("messages", []))
+        response = call_with_backoff("openai", lambda: client.chat.completions.create(**params), tokens, span)
+        _record_usage(span, response)
+        content = response.choices[0].message.content
+        cache.set("openai", params, content)
+        return content
+
+async def chat_completion_async(client, **params):
+    with telemetry.span("openai", model=params.get("model")) as span:
+        cached = cache.get("openai", params)
+        if cached is not None:
+            span["cache_hit"] = True
+            return cached
+        tokens = estimate_chat_tokens(params.get("messages", []))
+        response = await call_with_backoff_async("openai", lambda: client.chat.completions.create(**params), tokens, span)
+        _record_usage(span, response)
+        content = response.choices[0].message.content
+        cache.set("openai", params, content)
+        return content
+
+# --- 2. Tavily search (returns the raw response dict) ---
+def tavily_search(tavily, **params):
+    with telemetry.span("tavily") as span:
+        cached = cache.get("tavily", params)
+        if cached is not None:
+            span["cache_hit"] = True
+            return cached
+        response = call_with_backoff("tavily", lambda: tavily.search(**params), span=span)
+        cache.set("tavily", params, response)
+        return response
+
+async def tavily_search_async(tavily, **params):
+    with telemetry.span("tavily") as span:
+        cached = cache.get("tavily", params)
+        if cached is not None:
+            span["cache_hit"] = True
+            return cached
+        response = await call_with_backoff_async("tavily", lambda: tavily.search(**params), span=span)
+        cache.set("tavily", params, response)
+        return response
+
+# --- 3. News APIs over plain HTTP (returns the decoded JSON body) ---
+def http_get_json(provider, url, params=None, session=None):
+    with telemetry.span(provider) as span:
+        request = {"url": url, **(params or {})}
+        cached = cache.get(provider, request)
+        if cached is not None:
+            span["cache_hit"] = True
+            return cached
+
+        http = session or requests
+
+        def make_call():
+            response = http.get(url, params=params, timeout=30)
+            response.raise_for_status()
+            return response.json()
+
+        body = call_with_backoff(provider, make_call, span=span)
+        cache.set(provider, request, body)
+        return body
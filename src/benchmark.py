@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from mock_providers import MockProviderServer, Fixtures, add_fault_arguments, faults_from_args, PROVIDERS
+
+# --- 1. Settings ---
+# Runs phases 3 and 4 end to end against the mock provider server (recorded responses, no
+# API quota spent), in a scratch directory with a fresh lead index, and reports throughput,
+# API calls per qualified lead and peak memory. Every run is appended to the results file;
+# --save-baseline stores it as the reference the next runs are compared against.
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = "benchmark_results.jsonl"
+BASELINE_PATH = "benchmark_baseline.json"
+
+# Metrics compared against the baseline, and whether higher is better
+COMPARED_METRICS = [
+    ("articles_per_second", True),
+    ("wall_seconds", False),
+    ("phase3_seconds", False),
+    ("phase4_seconds", False),
+    ("calls_per_qualified_lead", False),
+    ("peak_memory_mb", False),
+]
+
+# --- 2. Running one phase ---
+# Each phase runs as its own process, exactly as in production; os.wait4 gives us that
+# process's own peak RSS (ru_maxrss is in KB on Linux).
+def run_phase(script, args, workdir, env, log_name):
+    started = time.monotonic()
+    with open(os.path.join(workdir, log_name), "w") as log:
+        process = subprocess.Popen([sys.executable, os.path.join(HERE, script), *args],
+                                   cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+    return {
+        "seconds": time.monotonic() - started,
+        "peak_memory_mb": usage.ru_maxrss / 1024,
+        "exit_code": os.waitstatus_to_exitcode(status),
+    }
+
+def count_lines(filepath):
+    if not os.path.exists(filepath):
+        return 0
+    with open(filepath, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# --- 3. One benchmark run ---
+def run_benchmark(args):
+    fixtures = Fixtures.load(args.raw, args.icps, args.qualified)
+    server = MockProviderServer(fixtures, faults_from_args(args))
+    server.start()
+
+    workdir = tempfile.mkdtemp(prefix="lead-bench-")
+    shutil.copy(args.icps, os.path.join(workdir, "icp_profiles.json"))
+    env = {
+        **os.environ,
+        **server.environment(),
+        # Dummy keys: every request goes to the mock server
+        "OPENAI_API_KEY": "sk-benchmark", "TAVILY_API_KEY": "tvly-benchmark",
+        "GNEWS_API_KEY": "benchmark", "NEWSAPI_KEY": "benchmark",
+        "LEAD_INDEX_PATH": os.path.join(workdir, ".lead_index.sqlite"),
+        "COMPANY_INDEX_PATH": os.path.join(workdir, ".company_index.sqlite"),
+        "VECTOR_INDEX_PATH": os.path.join(workdir, ".vector_index"),
+        "PHASE4_QUEUE_PATH": os.path.join(workdir, "phase4_queue.sqlite"),
+        "RESPONSE_CACHE_PATH": os.path.join(workdir, ".response_cache.sqlite"),
+        "TELEMETRY_PATH": os.path.join(workdir, "telemetry.jsonl"),
+        "PYTHONUNBUFFERED": "1",
+    }
+    if not args.real_budgets:
+        # Measure the pipeline, not our own client-side budgets (the server injects 429s instead)
+        for provider in PROVIDERS:
+            env[f"{provider.upper()}_RPM"] = "1000000"
+        env["OPENAI_TPM"] = "1000000000"
+
+    print(f"Benchmarking phases 3 and 4 against {server.base_url} (scratch dir: {workdir})...")
+    common = ["--no-cache"]
+    phase3 = run_phase("phase3_scout.py", common + args.phase3_args, workdir, env, "phase3.log")
+    phase4 = run_phase("phase4_analyst.py", common + args.phase4_args, workdir, env, "phase4.log")
+    server.shutdown()
+    server.server_close()
+
+    raw_leads = count_lines(os.path.join(workdir, "raw_leads.jsonl"))
+    qualified = count_lines(os.path.join(workdir, "qualified_leads.jsonl"))
+    wall = phase3["seconds"] + phase4["seconds"]
+    calls = sum(counts["requests"] for counts in server.counts.values())
+    result = {
+        "label": args.label,
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "faults": {"latency_ms": args.latency_ms, "error_rate": args.error_rate,
+                   "rate_limit_rate": args.rate_limit_rate, "seed": args.seed},
+        "raw_leads": raw_leads,
+        "qualified_leads": qualified,
+        "wall_seconds": round(wall, 3),
+        "phase3_seconds": round(phase3["seconds"], 3),
+        "phase4_seconds": round(phase4["seconds"], 3),
+        "articles_per_second": round(raw_leads / wall, 3) if wall else 0.0,
+        "api_calls": calls,
+        "calls_per_qualified_lead": round(calls / qualified, 3) if qualified else None,
+        "calls_by_provider": server.counts,
+        "peak_memory_mb": round(max(phase3["peak_memory_mb"], phase4["peak_memory_mb"]), 1),
+        "exit_codes": [phase3["exit_code"], phase4["exit_code"]],
+    }
+    if args.keep:
+        print(f"Logs and outputs kept in {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+# --- 4. Reporting ---
+def print_result(result, baseline=None):
+    print("\n=================================================")
+    print(f"Benchmark '{result['label']}' ({result['revision'] or 'no git revision'}):")
+    print(f"  {result['raw_leads']} raw lead(s) -> {result['qualified_leads']} qualified, "
+          f"{result['api_calls']} API call(s)")
+    for provider, counts in result["calls_by_provider"].items():
+        print(f"    {provider:<8} {counts['requests']:>5} request(s), {counts['rate_limited']} 429(s), "
+              f"{counts['errors']} 500(s) injected")
+    print(f"\n  {'metric':<26} {'current':>10} {'baseline':>10} {'change':>9}")
+    for metric, higher_is_better in COMPARED_METRICS:
+        current = result.get(metric)
+        previous = (baseline or {}).get(metric)
+        change = ""
+        if current is not None and previous:
+            delta = (current - previous) / previous * 100
+            better = delta > 0 if higher_is_better else delta < 0
+            change = f"{delta:+.1f}% {'✅' if better else ('➖' if abs(delta) < 1 else '⚠️')}"
+        current_text = "-" if current is None else f"{current:.3f}"
+        previous_text = "-" if previous is None else f"{previous:.3f}"
+        print(f"  {metric:<26} {current_text:>10} {previous_text:>10} {change:>9}")
+    if baseline and baseline.get("faults") != result["faults"]:
+        print(f"\n⚠️  Baseline was recorded with different fault settings: {baseline.get('faults')}")
+    if any(result["exit_codes"]):
+        print(f"\n❌ A phase exited with an error (exit codes {result['exit_codes']}); rerun with --keep to see the logs.")
+    print("=================================================")
+
+def load_baseline(filepath):
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+# --- 5. Main execution block ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of phases 3 and 4 against recorded fixtures.")
+    parser.add_argument("--label", default="run", help="Name stored with the result (e.g. the change being measured).")
+    parser.add_argument("--raw", default=os.path.join(HERE, "raw_leads.json"), help="Recorded news articles.")
+    parser.add_argument("--icps", default=os.path.join(HERE, "icp_profiles.json"), help="Recorded ICPs.")
+    parser.add_argument("--qualified", default=os.path.join(HERE, "qualified_leads.json"),
+                        help="Recorded Phase 4 verdicts.")
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSONL file every result is appended to.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Result the run is compared against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline.")
+    parser.add_argument("--real-budgets", action="store_true",
+                        help="Keep the client-side rate limits instead of lifting them for the benchmark.")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory (logs, outputs, spans).")
+    parser.add_argument("--phase3-args", default="",
+                        help='Extra arguments for phase3_scout.py, as one string (e.g. --phase3-args="--workers 4").')
+    parser.add_argument("--phase4-args", default="",
+                        help='Extra arguments for phase4_analyst.py, as one string (e.g. --phase4-args="--no-cascade").')
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    args.phase3_args = args.phase3_args.split()
+    args.phase4_args = args.phase4_args.split()
+
+    result = run_benchmark(args)
+    baseline = load_baseline(args.baseline)
+    print_result(result, baseline)
+
+    with open(args.results, "a") as f:
+        f.write(json.dumps(result) + "\n")
+    print(f"Result appended to '{args.results}'.")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved as the new baseline in '{args.baseline}'.")
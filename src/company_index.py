@@ -0,0 +1,229 @@
+import os
+import time
+import sqlite3
+import argparse
+from company_names import normalize_company_name
+from model_cascade import is_missing
+from prefilter import load_json
+
+# --- 1. Settings ---
+# Persistent record of every company Phase 4 has qualified, across runs:
+#   - one row per company, keyed by its normalised name, with the best-known HQ city and
+#     key person and the Tavily enrichment context (with the time it was fetched),
+#   - every surface name seen for it ("Tech Mahindra Limited", "Tech Mahindra") as an alias,
+#     plus the alias's character trigrams for fuzzy lookups ("Larsen & Tubro" vs "Larsen & Toubro"),
+#   - every qualifying signal, one per article.
+# Phase 4 resolves each triaged company against it before enrichment: articles about one
+# company are enriched together, and a company enriched within the freshness window needs
+# no new Tavily searches at all.
+COMPANY_INDEX_PATH = os.getenv("COMPANY_INDEX_PATH", ".company_index.sqlite")
+DEFAULT_FRESHNESS_DAYS = float(os.getenv("COMPANY_FRESHNESS_DAYS", "30"))
+# Minimum trigram similarity (Jaccard, 0-1) for two names to count as the same company
+MATCH_THRESHOLD = float(os.getenv("COMPANY_MATCH_THRESHOLD", "0.7"))
+# Fields copied from a qualified lead into the company record when the lead has them
+PROFILE_FIELDS = ["location_city", "key_person_name", "key_person_role"]
+
+def company_key(name):
+    return normalize_company_name(name) or (name or "").strip().lower()
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# --- 2. Index ---
+class CompanyIndex:
+    def __init__(self, path=COMPANY_INDEX_PATH, freshness_days=DEFAULT_FRESHNESS_DAYS, threshold=MATCH_THRESHOLD):
+        self.freshness_seconds = freshness_days * 86400
+        self.threshold = threshold
+        # Counters for the end-of-run summary
+        self.stats = {"reused": 0, "enriched": 0, "merged": 0, "new": 0}
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS companies (
+                company_key TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                location_city TEXT,
+                key_person_name TEXT,
+                key_person_role TEXT,
+                enriched_context TEXT,
+                enriched_at REAL,
+                first_seen_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS aliases (
+                alias_key TEXT PRIMARY KEY,
+                company_key TEXT NOT NULL,
+                name TEXT NOT NULL,
+                trigram_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS alias_trigrams (
+                trigram TEXT NOT NULL,
+                alias_key TEXT NOT NULL,
+                PRIMARY KEY (trigram, alias_key)
+            );
+            CREATE TABLE IF NOT EXISTS signals (
+                company_key TEXT NOT NULL,
+                article_key TEXT NOT NULL,
+                signal TEXT,
+                summary TEXT,
+                seen_at REAL NOT NULL,
+                PRIMARY KEY (company_key, article_key)
+            );
+        """)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.commit()
+
+    # --- Lookup: exact alias first, then the closest alias by trigram similarity ---
+    def resolve(self, name):
+        key = company_key(name)
+        if not key:
+            return None
+        row = self.connection.execute("SELECT company_key FROM aliases WHERE alias_key = ?", (key,)).fetchone()
+        if row is None:
+            row = self._fuzzy_match(key)
+        if row is None:
+            return None
+        return self.get(row["company_key"])
+
+    def _fuzzy_match(self, key):
+        grams = trigrams(key)
+        placeholders = ",".join("?" * len(grams))
+        candidates = self.connection.execute(f"""
+            SELECT a.alias_key, a.company_key, a.trigram_count, COUNT(*) AS shared
+            FROM alias_trigrams t JOIN aliases a ON a.alias_key = t.alias_key
+            WHERE t.trigram IN ({placeholders})
+            GROUP BY a.alias_key ORDER BY shared DESC LIMIT 10
+        """, list(grams)).fetchall()
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            score = candidate["shared"] / (len(grams) + candidate["trigram_count"] - candidate["shared"])
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def get(self, key):
+        row = self.connection.execute("SELECT * FROM companies WHERE company_key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def aliases(self, key):
+        return [row["name"] for row in self.connection.execute(
+            "SELECT name FROM aliases WHERE company_key = ? ORDER BY name", (key,))]
+
+    # The stored Tavily context, if it was fetched within the freshness window and every search
+    # in it found something ("People search results: " with nothing after it is searched again)
+    def fresh_context(self, key):
+        company = self.get(key)
+        if company is None or not company["enriched_context"] or company["enriched_at"] is None:
+            return None
+        if time.time() - company["enriched_at"] > self.freshness_seconds:
+            return None
+        context = company["enriched_context"]
+        if any(not line.partition(":")[2].strip() for line in context.splitlines() if line.strip()):
+            return None
+        return context
+
+    # --- Updates ---
+    def _ensure_company(self, key, name, now):
+        self.connection.execute("""
+            INSERT OR IGNORE INTO companies (company_key, name, first_seen_at, updated_at) VALUES (?, ?, ?, ?)
+        """, (key, name, now, now))
+
+    def add_alias(self, key, name):
+        alias_key = company_key(name)
+        if not alias_key:
+            return
+        grams = trigrams(alias_key)
+        inserted = self.connection.execute(
+            "INSERT OR IGNORE INTO aliases (alias_key, company_key, name, trigram_count) VALUES (?, ?, ?, ?)",
+            (alias_key, key, name, len(grams)),
+        ).rowcount
+        if inserted:
+            self.connection.executemany("INSERT OR IGNORE INTO alias_trigrams (trigram, alias_key) VALUES (?, ?)",
+                                        [(gram, alias_key) for gram in grams])
+
+    def record_enrichment(self, key, name, context):
+        now = time.time()
+        self._ensure_company(key, name, now)
+        self.add_alias(key, name)
+        self.connection.execute(
+            "UPDATE companies SET enriched_context = ?, enriched_at = ?, updated_at = ? WHERE company_key = ?",
+            (context, now, now, key),
+        )
+        self.connection.commit()
+
+    # Folds a qualified lead into its company: the lead's name becomes an alias, newly found
+    # profile fields are stored, and the signal is added. Returns the lead with the company's
+    # canonical name and any profile fields it was missing filled in from the record.
+    def merge_lead(self, key, lead, article_id):
+        now = time.time()
+        name = lead.get("company_name")
+        self._ensure_company(key, name, now)
+        self.add_alias(key, name)
+        updates = {field: lead[field] for field in PROFILE_FIELDS if not is_missing(lead.get(field))}
+        if updates:
+            assignments = ", ".join(f"{field} = ?" for field in updates)
+            self.connection.execute(f"UPDATE companies SET {assignments}, updated_at = ? WHERE company_key = ?",
+                                    [*updates.values(), now, key])
+        inserted = self.connection.execute("""
+            INSERT OR IGNORE INTO signals (company_key, article_key, signal, summary, seen_at) VALUES (?, ?, ?, ?, ?)
+        """, (key, article_id, lead.get("qualifying_event_signal"), lead.get("summary"), now)).rowcount
+        self.connection.commit()
+        self.stats["new" if inserted and self.signal_count(key) == 1 else "merged"] += 1
+
+        company = self.get(key)
+        merged = {**lead, "company_name": company["name"]}
+        for field in PROFILE_FIELDS:
+            if is_missing(merged.get(field)) and not is_missing(company[field]):
+                merged[field] = company[field]
+        return merged
+
+    def signal_count(self, key):
+        return self.connection.execute("SELECT COUNT(*) FROM signals WHERE company_key = ?", (key,)).fetchone()[0]
+
+    def company_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+
+    def summary(self):
+        s = self.stats
+        return (f"Company index: {s['reused']} known company(ies) reused without Tavily searches, {s['enriched']} "
+                f"searched; {s['new']} new lead(s), {s['merged']} merged into known companies "
+                f"({self.company_count()} companies on record)")
+
+    def close(self):
+        self.connection.close()
+
+# --- 3. Report / import (python company_index.py [--import qualified_leads.json]) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the companies Phase 4 knows about, or seed the index.")
+    parser.add_argument("--path", default=COMPANY_INDEX_PATH)
+    parser.add_argument("--import", dest="import_path", default=None,
+                        help="Merge every lead of a qualified_leads.json file into the index first.")
+    parser.add_argument("--lookup", default=None, help="Resolve one company name and show its record.")
+    args = parser.parse_args()
+
+    index = CompanyIndex(args.path)
+    if args.import_path:
+        for position, lead in enumerate(load_json(args.import_path, [])):
+            if is_missing(lead.get("company_name")):
+                continue
+            known = index.resolve(lead["company_name"])
+            index.merge_lead(known["company_key"] if known else company_key(lead["company_name"]), lead,
+                             f"{args.import_path}#{position}")
+        print(f"Imported '{args.import_path}': {index.stats['new']} new, {index.stats['merged']} merged.")
+
+    if args.lookup:
+        company = index.resolve(args.lookup)
+        if company is None:
+            print(f"No company matches '{args.lookup}'.")
+        else:
+            print(f"{company['name']} ({company['company_key']}): {company['location_city']}, "
+                  f"{company['key_person_name']} ({company['key_person_role']})")
+            print(f"  aliases: {', '.join(index.aliases(company['company_key']))}")
+            print(f"  signals: {index.signal_count(company['company_key'])}")
+    else:
+        for row in index.connection.execute("SELECT company_key, name, location_city FROM companies ORDER BY name"):
+            aliases = index.aliases(row["company_key"])
+            print(f"{row['name']:<40} {row['location_city'] or '-':<15} {index.signal_count(row['company_key']):>3} "
+                  f"signal(s)  aliases: {', '.join(aliases)}")
+    index.close()
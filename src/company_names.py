@@ -0,0 +1,39 @@
+import re
+import unicodedata
+
+# --- Company name normalisation ---
+# Different articles (and different LLM answers) name the same organisation in slightly
+# different ways: "Tech Mahindra Limited" vs "Tech Mahindra", "Salesforce India" vs
+# "Salesforce", "Department of Telecommunications (DoT)". This reduces each of them to
+# one comparable key.
+
+LEGAL_SUFFIXES = {
+    "limited", "ltd", "pvt", "private", "inc", "incorporated", "corp", "corporation",
+    "co", "company", "plc", "llp", "llc", "gmbh", "ag", "sa", "bv", "nv", "group", "holdings",
+}
+
+# Single words that are a company's own name together with "India" ("Air India", "Coal
+# India"), not an Indian arm; names ending "of India" are also kept whole (see below)
+INDIA_IN_NAME = {"air", "coal", "oil", "engineers", "digital", "startup"}
+
+def normalize_company_name(name):
+    if not name:
+        return ""
+    # Strip accents ("Systèmes" -> "systemes") and parenthetical acronyms ("(DoT)")
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    text = re.sub(r"\([^)]*\)", " ", text.lower())
+    text = text.replace("&", " and ")
+    tokens = re.findall(r"[a-z0-9]+", text)
+
+    if tokens and tokens[0] == "the":
+        tokens = tokens[1:]
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    # "Salesforce India" is the Indian arm of "Salesforce" for our purposes, but "Air India"
+    # and "Bank of India" are companies of their own
+    if len(tokens) > 1 and tokens[-1] == "india" and tokens[-2] != "of" \
+            and not (len(tokens) == 2 and tokens[0] in INDIA_IN_NAME):
+        tokens.pop()
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import hashlib
+
+# --- 1. Append-only JSONL handoff between phases ---
+# Phase 3 appends one lead per line to raw_leads.jsonl and drops a "raw_leads.jsonl.done"
+# marker when it finishes. Phase 4 reads complete lines as they appear (so it can start
+# while Phase 3 is still running) and never holds more than one window of leads in memory.
+
+DONE_SUFFIX = ".done"
+
+def done_marker(path):
+    return path + DONE_SUFFIX
+
+def mark_done(path):
+    with open(done_marker(path), "w") as f:
+        f.write(str(time.time()))
+        f.flush()
+        os.fsync(f.fileno())
+
+def clear_done(path):
+    if os.path.exists(done_marker(path)):
+        os.remove(done_marker(path))
+
+def is_done(path):
+    return os.path.exists(done_marker(path))
+
+# --- 2. Writer: one record per line, flushed (and fsynced) straight away ---
+class JsonlWriter:
+    def __init__(self, path, truncate=False, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self.file = open(path, "w" if truncate else "a", encoding="utf-8")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+# Identifies the file a checkpoint offset belongs to: its first line and the bytes just before
+# the offset. The file is only ever appended to, so both stay the same until it's rewritten
+# (phase 3 --full truncates it, and the new file may well be longer than the old offset).
+FINGERPRINT_TAIL = 4096
+
+def file_fingerprint(path, offset):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        digest.update(f.readline())
+        f.seek(max(0, offset - FINGERPRINT_TAIL))
+        digest.update(f.read(min(offset, FINGERPRINT_TAIL)))
+    return digest.hexdigest()
+
+# --- 3. Reader: complete lines only, from a byte offset, optionally following the producer ---
+class JsonlReader:
+    def __init__(self, path, offset=0, follow=False, poll_interval=1.0, fingerprint=None):
+        self.path = path
+        self.offset = offset
+        self.fingerprint = fingerprint
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.finished = False
+        self.file = None
+
+    def _open(self):
+        if self.file is None and os.path.exists(self.path):
+            self.file = open(self.path, "rb")
+            # The producer may have rewritten the file since our checkpoint (e.g. phase 3 --full)
+            if self.offset and not self._same_file():
+                print(f"'{self.path}' was rewritten since the last checkpoint; reading it from the start.")
+                self.offset = 0
+            self.file.seek(self.offset)
+        return self.file
+
+    def _same_file(self):
+        if self.offset > os.path.getsize(self.path):
+            return False
+        if self.fingerprint:
+            return file_fingerprint(self.path, self.offset) == self.fingerprint
+        # Checkpoints from before fingerprints: at least the offset must be at a line start
+        self.file.seek(self.offset - 1)
+        return self.file.read(1) == b"\n"
+
+    # What to store in a checkpoint to resume after the lines read so far
+    def checkpoint(self):
+        fingerprint = file_fingerprint(self.path, self.offset) if self.offset else None
+        return {"offset": self.offset, "fingerprint": fingerprint}
+
+    # A line without its trailing newline is still being written: leave it for next time
+    def _read_line(self):
+        file = self._open()
+        if file is None:
+            return None
+        position = file.tell()
+        line = file.readline()
+        if not line.endswith(b"\n"):
+            file.seek(position)
+            return None
+        self.offset = file.tell()
+        return line
+
+    # Returns up to `max_records` records. In follow mode it waits for new lines, but hands
+    # back a partial window once `max_wait` seconds pass without it filling up.
+    def read_batch(self, max_records, max_wait=5.0):
+        records = []
+        started = time.monotonic()
+        while len(records) < max_records:
+            # Check the marker *before* reading so a last line written just before it isn't lost
+            producer_done = not self.follow or is_done(self.path)
+            line = self._read_line()
+            if line is None:
+                if producer_done:
+                    self.finished = True
+                    break
+                if records and time.monotonic() - started >= max_wait:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            if line.strip():
+                records.append(json.loads(line))
+        return records
+
+    def __iter__(self):
+        while not self.finished:
+            yield from self.read_batch(100)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# --- 4. Checkpoints & exports ---
+# Write to a temp file, fsync, then rename: a crash leaves either the old or the new version
+def atomic_write_json(path, data, indent=None):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def read_checkpoint(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+# Streams a JSONL file into a pretty-printed JSON array (the format the phases used to share).
+# With `sort_key` the records are loaded and sorted first (stable, so ties keep file order).
+# With `unique_key` only the first record per value of that field is exported (records
+# without it are all kept), e.g. when a crash made a writer append the same records twice.
+def export_json_array(jsonl_path, json_path, sort_key=None, unique_key=None):
+    temp_path = json_path + ".tmp"
+    count = 0
+    reader = JsonlReader(jsonl_path) if os.path.exists(jsonl_path) else None
+    records = [] if reader is None else (sorted(reader, key=sort_key) if sort_key else reader)
+    seen = set()
+    with open(temp_path, "w", encoding="utf-8") as out:
+        out.write("[")
+        for record in records:
+            if unique_key and record.get(unique_key) is not None:
+                if record[unique_key] in seen:
+                    continue
+                seen.add(record[unique_key])
+            out.write(",\n" if count else "\n")
+            out.write("  " + json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+            count += 1
+        out.write("\n]\n" if count else "]\n")
+        out.flush()
+        os.fsync(out.fileno())
+    if reader is not None:
+        reader.close()
+    os.replace(temp_path, json_path)
+    return count
+
+# One-off conversion of a legacy whole-file JSON array into JSONL
+def convert_json_array(json_path, jsonl_path):
+    with open(json_path, "r") as f:
+        records = json.load(f)
+    writer = JsonlWriter(jsonl_path, truncate=True, fsync=False)
+    for record in records:
+        writer.write(record)
+    writer.close()
+    return len(records)
@@ -0,0 +1,105 @@
+import os
+import time
+import sqlite3
+import hashlib
+from near_duplicates import article_text
+
+# --- 1. Settings ---
+# Persistent memory shared by Phase 3 and Phase 4 across scheduled runs:
+#   - every article ever scouted (by API id / URL and by content hash),
+#   - a per-(ICP, source) "publishedAt" cursor so the next run only asks for newer news,
+#   - which articles Phase 4 has already analysed, so it only processes the delta.
+INDEX_PATH = os.getenv("LEAD_INDEX_PATH", ".lead_index.sqlite")
+
+# --- 2. Article identity ---
+# GNews articles carry an id; NewsAPI ones don't, so fall back to a hash of the URL
+def article_key(article):
+    if article.get("id"):
+        return str(article["id"])
+    return hashlib.sha1((article.get("url") or "").encode("utf-8")).hexdigest()
+
+# Same story text (ignoring API boilerplate) -> same hash, whatever the URL
+def content_hash(article):
+    text = " ".join(article_text(article).split())
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+# --- 3. Index ---
+class LeadIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS articles (
+                article_key TEXT PRIMARY KEY,
+                url TEXT,
+                content_hash TEXT,
+                first_seen_at REAL NOT NULL,
+                analysed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS articles_url ON articles (url);
+            CREATE INDEX IF NOT EXISTS articles_content ON articles (content_hash);
+            CREATE TABLE IF NOT EXISTS cursors (
+                icp_name TEXT NOT NULL,
+                source TEXT NOT NULL,
+                published_at TEXT NOT NULL,
+                PRIMARY KEY (icp_name, source)
+            );
+        """)
+        self.connection.commit()
+
+    def is_seen(self, article):
+        row = self.connection.execute(
+            "SELECT 1 FROM articles WHERE article_key = ? OR url = ? OR content_hash = ? LIMIT 1",
+            (article_key(article), article.get("url"), content_hash(article)),
+        ).fetchone()
+        return row is not None
+
+    def mark_seen(self, articles):
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO articles (article_key, url, content_hash, first_seen_at) VALUES (?, ?, ?, ?)",
+            [(article_key(a), a.get("url"), content_hash(a), now) for a in articles],
+        )
+        self.connection.commit()
+
+    # --- Cursors: newest publishedAt seen per (ICP, source) ---
+    def get_cursor(self, icp_name, source):
+        row = self.connection.execute(
+            "SELECT published_at FROM cursors WHERE icp_name = ? AND source = ?", (icp_name, source)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_cursors(self):
+        return {(icp_name, source): published_at for icp_name, source, published_at
+                in self.connection.execute("SELECT icp_name, source, published_at FROM cursors")}
+
+    # ISO-8601 UTC timestamps compare correctly as strings, so MAX() keeps the newest
+    def advance_cursor(self, icp_name, source, published_at):
+        self.connection.execute("""
+            INSERT INTO cursors (icp_name, source, published_at) VALUES (?, ?, ?)
+            ON CONFLICT (icp_name, source) DO UPDATE SET published_at = MAX(published_at, excluded.published_at)
+        """, (icp_name, source, published_at))
+        self.connection.commit()
+
+    # --- Phase 4 bookkeeping ---
+    def is_analysed(self, article):
+        row = self.connection.execute(
+            "SELECT analysed_at FROM articles WHERE article_key = ?", (article_key(article),)
+        ).fetchone()
+        return row is not None and row[0] is not None
+
+    def mark_analysed(self, articles):
+        now = time.time()
+        # Articles may come from a hand-made raw_leads.json that Phase 3 never indexed
+        self.mark_seen(articles)
+        self.connection.executemany(
+            "UPDATE articles SET analysed_at = ? WHERE article_key = ?",
+            [(now, article_key(a)) for a in articles],
+        )
+        self.connection.commit()
+
+    def analysed_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM articles WHERE analysed_at IS NOT NULL").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
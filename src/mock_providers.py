@@ -0,0 +1,268 @@
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from company_names import normalize_company_name
+from prefilter import match_leads_to_articles, load_json
+
+# --- 1. Fixtures ---
+# A local stand-in for GNews, NewsAPI, Tavily and OpenAI, replaying the recorded pipeline
+# data (raw_leads.json, icp_profiles.json, qualified_leads.json) so phases 3 and 4 can run
+# end to end without spending API quota. Point the pipeline at it with:
+#   GNEWS_API_URL=http://HOST:PORT/gnews/search   NEWSAPI_API_URL=http://HOST:PORT/newsapi/everything
+#   TAVILY_API_URL=http://HOST:PORT/tavily        OPENAI_BASE_URL=http://HOST:PORT/openai/v1
+PROVIDERS = ["gnews", "newsapi", "tavily", "openai"]
+NOT_A_LEAD = {"company_name": "N/A", "location_city": "N/A", "key_person_name": "N/A", "key_person_role": "N/A",
+              "qualifying_event_signal": "N/A", "summary": "N/A"}
+
+# Same query string phase3_scout builds for an ICP
+def icp_query(icp):
+    industry = " OR ".join([f'"{i}"' for i in icp.get("industry_vertical", [])])
+    return f'({industry}) AND "AI"'
+
+class Fixtures:
+    def __init__(self, raw_leads, icp_data, qualified_leads):
+        icp_by_name = {icp.get("icp_name"): icp for icp in icp_data.get("ideal_customer_profiles", [])}
+        # GNews articles carry an id, NewsAPI ones don't
+        self.articles = {}  # (source, query) -> [articles]
+        for article in raw_leads:
+            icp = icp_by_name.get(article.get("matched_icp"))
+            if icp is None:
+                continue
+            source = "gnews" if article.get("id") else "newsapi"
+            self.articles.setdefault((source, icp_query(icp)), []).append(article)
+
+        # The recorded verdict for each article, keyed by title
+        lead_by_article = match_leads_to_articles(raw_leads, qualified_leads)
+        self.lead_by_title = {raw_leads[index].get("title"): lead for index, lead in lead_by_article.items()}
+        self.lead_by_company = {normalize_company_name(lead.get("company_name", "")): lead
+                                for lead in qualified_leads}
+
+    @classmethod
+    def load(cls, raw_path="raw_leads.json", icp_path="icp_profiles.json", qualified_path="qualified_leads.json"):
+        return cls(load_json(raw_path, []), load_json(icp_path, {}), load_json(qualified_path, []))
+
+    def news(self, source, query, page, page_size, since=None):
+        articles = self.articles.get((source, query), [])
+        if since:
+            articles = [article for article in articles if (article.get("publishedAt") or "") >= since]
+        return articles[(page - 1) * page_size:page * page_size]
+
+    def verdict(self, title):
+        lead = self.lead_by_title.get(title)
+        return {field: (lead or NOT_A_LEAD).get(field, "N/A") for field in NOT_A_LEAD}
+
+    # Tavily results built from the recorded lead for the company named at the start of the query
+    def search(self, query):
+        for suffix in (" headquarters location India", " CEO CTO"):
+            if query.endswith(suffix):
+                lead = self.lead_by_company.get(normalize_company_name(query[:-len(suffix)]))
+                break
+        else:
+            lead = None
+        if lead is None:
+            return []
+        return [{
+            "title": lead.get("company_name"),
+            "url": f"https://example.com/{normalize_company_name(lead.get('company_name', '')).replace(' ', '-')}",
+            "content": f"{lead.get('company_name')} is headquartered in {lead.get('location_city')}. "
+                       f"{lead.get('key_person_name')} is its {lead.get('key_person_role')}.",
+            "score": 0.9,
+        }]
+
+# --- 2. Fault injection ---
+# Every request waits `latency_ms` (+/- `jitter`), then fails with a 500 with probability
+# `error_rate`, or with a 429 (and a Retry-After header) with probability `rate_limit_rate`.
+class Faults:
+    def __init__(self, latency_ms=50.0, jitter=0.5, error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    # Returns (delay seconds, status to inject or None)
+    def draw(self):
+        with self.lock:
+            delay = self.latency_ms * (1 + self.random.uniform(-self.jitter, self.jitter)) / 1000
+            roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return delay, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, 500
+        return delay, None
+
+# --- 3. OpenAI answers ---
+TITLE_PATTERN = re.compile(r'- Title: "(.*)"\s*$', re.MULTILINE)
+
+def chat_answer(fixtures, prompt):
+    # Batched triage: one JSON object per article, answered with {"verdicts": [...]}
+    if '"verdicts"' in prompt:
+        verdicts = []
+        for line in prompt.splitlines():
+            line = line.strip()
+            if line.startswith("{") and '"id"' in line:
+                try:
+                    article = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                verdicts.append({"id": article.get("id"), **fixtures.verdict(article.get("title"))})
+        return json.dumps({"verdicts": verdicts})
+    match = TITLE_PATTERN.search(prompt)
+    return json.dumps(fixtures.verdict(match.group(1) if match else None))
+
+def chat_completion_body(model, content, prompt):
+    return {
+        "id": f"chatcmpl-mock-{random.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                  "total_tokens": len(prompt) // 4 + len(content) // 4},
+    }
+
+# --- 4. Server ---
+class MockProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Several client processes open connections at once; the default backlog of 5 makes the
+    # kernel drop SYNs, which shows up as 1 s latency spikes
+    request_queue_size = 128
+
+    def __init__(self, fixtures, faults, host="127.0.0.1", port=0):
+        super().__init__((host, port), MockProviderHandler)
+        self.fixtures = fixtures
+        self.faults = faults
+        self.lock = threading.Lock()
+        self.counts = {provider: {"requests": 0, "rate_limited": 0, "errors": 0} for provider in PROVIDERS}
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    # Environment variables that point the pipeline at this server
+    def environment(self):
+        return {
+            "GNEWS_API_URL": f"{self.base_url}/gnews/search",
+            "NEWSAPI_API_URL": f"{self.base_url}/newsapi/everything",
+            "TAVILY_API_URL": f"{self.base_url}/tavily",
+            "OPENAI_BASE_URL": f"{self.base_url}/openai/v1",
+        }
+
+    def count(self, provider, key):
+        with self.lock:
+            self.counts[provider][key] += 1
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    # Latency plus injected failures; returns True if the request was already answered
+    def _inject(self, provider):
+        self.server.count(provider, "requests")
+        delay, status = self.server.faults.draw()
+        time.sleep(delay)
+        if status == 429:
+            self.server.count(provider, "rate_limited")
+            self._send_json(429, {"error": "rate limited (injected)"},
+                            {"Retry-After": str(self.server.faults.retry_after)})
+            return True
+        if status == 500:
+            self.server.count(provider, "errors")
+            self._send_json(500, {"error": "server error (injected)"})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        fixtures = self.server.fixtures
+        if url.path == "/gnews/search":
+            if self._inject("gnews"):
+                return
+            articles = fixtures.news("gnews", params.get("q"), int(params.get("page", 1)),
+                                     int(params.get("max", 10)), params.get("from"))
+            self._send_json(200, {"totalArticles": len(articles), "articles": articles})
+        elif url.path == "/newsapi/everything":
+            if self._inject("newsapi"):
+                return
+            articles = fixtures.news("newsapi", params.get("q"), int(params.get("page", 1)),
+                                     int(params.get("pageSize", 10)), params.get("from"))
+            # Back into NewsAPI's own shape
+            articles = [{**article, "urlToImage": article.get("image"),
+                         "source": {"id": None, "name": (article.get("source") or {}).get("name")}}
+                        for article in articles]
+            self._send_json(200, {"status": "ok", "totalResults": len(articles), "articles": articles})
+        else:
+            self._send_json(404, {"error": f"unknown path {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        fixtures = self.server.fixtures
+        if url.path == "/tavily/search":
+            if self._inject("tavily"):
+                return
+            query = request.get("query", "")
+            results = fixtures.search(query)[:request.get("max_results") or 5]
+            self._send_json(200, {"query": query, "results": results, "response_time": 0.0})
+        elif url.path == "/openai/v1/chat/completions":
+            if self._inject("openai"):
+                return
+            # The instructions (system message) and the articles (user message) together
+            prompt = "\n".join(message.get("content") or "" for message in request.get("messages") or [])
+            content = chat_answer(fixtures, prompt)
+            self._send_json(200, chat_completion_body(request.get("model"), content, prompt))
+        else:
+            self._send_json(404, {"error": f"unknown path {url.path}"})
+
+def add_fault_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean latency added to every request.")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Latency varies by +/- this fraction.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with a 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with injected 429s.")
+    parser.add_argument("--seed", type=int, default=7, help="Seed for latency jitter and fault injection.")
+
+def faults_from_args(args):
+    return Faults(args.latency_ms, args.jitter, args.error_rate, args.rate_limit_rate, args.retry_after, args.seed)
+
+# --- 5. Stand-alone server (python mock_providers.py --port 8080) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded GNews/NewsAPI/Tavily/OpenAI responses locally.")
+    parser.add_argument("--port", type=int, default=8080)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockProviderServer(Fixtures.load(), faults_from_args(args), port=args.port)
+    print(f"Mock providers listening on {server.base_url}. Point the pipeline at it with:")
+    for name, value in server.environment().items():
+        print(f"  {name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,148 @@
+import os
+import re
+from company_names import normalize_company_name
+
+# --- 1. Settings ---
+# After enrichment, a lead is only sent to a bigger model when the record we already have
+# isn't good enough. Each record gets a confidence score: the share of checks it passes,
+# where a check is "field filled in" plus, for the company, city and key person, "also
+# mentioned in the article or the Tavily context". Anything the sources don't back up is
+# treated as a possible hallucination, not as a pass. A record that contradicts the Tavily
+# context (the location search names other cities, or the people search names executives
+# but not this one) gets confidence 0: a dateline city or a person quoted in passing is
+# exactly what the triage model tends to pick up, and the enrichment is there to catch it.
+#
+# Tier 0 is the gpt-4o-mini triage record (already paid for). Each later tier re-runs the
+# analysis with the enrichment context on its model; the first tier whose record reaches
+# its threshold wins, and the last tier is always accepted.
+# Format: "model:min_confidence,model:min_confidence" (PHASE4_CASCADE)
+DEFAULT_TRIAGE_CONFIDENCE = float(os.getenv("PHASE4_TRIAGE_CONFIDENCE", "1.0"))
+DEFAULT_CASCADE = os.getenv("PHASE4_CASCADE", "gpt-4o-mini:0.8,gpt-4o:0")
+
+# Fields every lead must have, and those that must be backed by the sources
+CHECKED_FIELDS = ["company_name", "location_city", "key_person_name", "key_person_role",
+                  "qualifying_event_signal", "summary"]
+GROUNDED_FIELDS = ["company_name", "location_city", "key_person_name"]
+MISSING_VALUES = {"", "n/a", "na", "none", "null", "unknown", "not found", "not available"}
+
+# Common alternative city names, so "Bangalore" in the article backs up "Bengaluru"
+CITY_ALIASES = {
+    "bengaluru": ["bangalore"], "bangalore": ["bengaluru"],
+    "mumbai": ["bombay"], "bombay": ["mumbai"],
+    "gurugram": ["gurgaon"], "gurgaon": ["gurugram"],
+    "chennai": ["madras"], "madras": ["chennai"],
+    "kolkata": ["calcutta"], "calcutta": ["kolkata"],
+    "mysuru": ["mysore"], "mysore": ["mysuru"],
+    "new delhi": ["delhi"], "delhi": ["new delhi"],
+}
+
+# Cities the location search is checked for; a city is the same as its aliases above
+KNOWN_CITIES = sorted(set(CITY_ALIASES) | {
+    "hyderabad", "pune", "ahmedabad", "noida", "jaipur", "kochi", "thiruvananthapuram", "coimbatore",
+    "indore", "chandigarh", "lucknow", "nagpur", "surat", "vadodara", "visakhapatnam", "bhubaneswar",
+    "thane", "navi mumbai", "mangaluru", "trichy", "madurai", "bhopal", "patna", "guwahati",
+})
+EXECUTIVE_ROLE = (r"(?:CEO|CTO|CFO|COO|CIO|MD|Chief [A-Z][a-z]+ Officer|(?:Co-)?[Ff]ounder|Chairman|"
+                  r"Chairperson|Managing Director|President)")
+PERSON_NAME = r"[A-Z][a-z]+(?:\s+[A-Z]\.)?(?:\s+[A-Z][a-z]+){1,2}"
+# "CEO Salil Parekh", "CEO is Salil Parekh", "Salil Parekh, CEO", "Salil Parekh, the company's CEO"
+EXECUTIVE_MENTION = re.compile(
+    rf"\b{EXECUTIVE_ROLE}[,:]?\s+(?:is\s+)?{PERSON_NAME}|{PERSON_NAME},?\s+(?:the\s+|its\s+|[A-Z][\w.&]*'s\s+)?"
+    rf"(?:company's\s+)?{EXECUTIVE_ROLE}\b"
+)
+
+def parse_cascade(spec):
+    tiers = []
+    for part in spec.split(","):
+        if part.strip():
+            model, _, threshold = part.strip().partition(":")
+            tiers.append((model.strip(), float(threshold or 0)))
+    return tiers
+
+# --- 2. Confidence checks ---
+def is_missing(value):
+    return not isinstance(value, str) or value.strip().lower() in MISSING_VALUES
+
+def _normalise_text(text):
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+def _mentioned(phrase, text):
+    phrase = _normalise_text(phrase)
+    return bool(phrase) and f" {phrase} " in f" {text} "
+
+def is_grounded(field, value, text):
+    if field == "company_name":
+        # "Tata Consultancy Services Ltd" is backed by "Tata Consultancy Services"
+        return _mentioned(normalize_company_name(value) or value, text)
+    if field == "location_city":
+        city = value.split(",")[0].strip().lower()
+        return any(_mentioned(name, text) for name in [city] + CITY_ALIASES.get(city, []))
+    if field == "key_person_name":
+        # Surnames are what articles repeat ("Mr Chandrasekaran"), so any name part of 3+ letters will do
+        return any(_mentioned(part, text) for part in value.split() if len(part) >= 3)
+    return True
+
+# The text of one search's section of the enrichment context (see phase4_analyst.enrich_company)
+def context_section(context, label):
+    for line in (context or "").splitlines():
+        if line.startswith(f"{label} search results:"):
+            return line.partition(":")[2].strip()
+    return ""
+
+# Where the record disagrees with what the Tavily searches found about the company
+def find_conflicts(lead, context):
+    conflicts = []
+    location = _normalise_text(context_section(context, "Location"))
+    city = lead.get("location_city")
+    if location and not is_missing(city) and not is_grounded("location_city", city, location):
+        found = [name for name in KNOWN_CITIES if _mentioned(name, location)]
+        if found:
+            conflicts.append(f"location_city '{city}' conflicts with the location search ({', '.join(found)})")
+    people = context_section(context, "People")
+    person = lead.get("key_person_name")
+    if people and not is_missing(person) and EXECUTIVE_MENTION.search(people) \
+            and not is_grounded("key_person_name", person, _normalise_text(people)):
+        conflicts.append(f"key_person_name '{person}' is not among the executives the people search names")
+    return conflicts
+
+# Returns (confidence between 0 and 1, list of problems)
+def lead_confidence(lead, article, context=""):
+    sources = _normalise_text(" ".join(
+        [str(article.get(field) or "") for field in ("title", "description", "content")] + [context or ""]
+    ))
+    problems = []
+    for field in CHECKED_FIELDS:
+        value = lead.get(field)
+        if is_missing(value):
+            problems.append(f"missing {field}")
+        elif field in GROUNDED_FIELDS and not is_grounded(field, value, sources):
+            problems.append(f"unsupported {field}")
+    conflicts = find_conflicts(lead, context)
+    if conflicts:
+        return 0.0, problems + conflicts
+    return 1 - len(problems) / len(CHECKED_FIELDS), problems
+
+# --- 3. Escalation stats ---
+# Counts which tier each lead was finally accepted at
+class CascadeStats:
+    def __init__(self):
+        self.accepted = {}
+        self.model_calls = {}
+
+    def accept(self, tier):
+        self.accepted[tier] = self.accepted.get(tier, 0) + 1
+
+    def called(self, model):
+        self.model_calls[model] = self.model_calls.get(model, 0) + 1
+
+    def summary(self):
+        total = sum(self.accepted.values())
+        if not total:
+            return "Model cascade: no enriched leads"
+        escalated = total - self.accepted.get("triage", 0)
+        tiers = ", ".join(f"{tier}: {count}" for tier, count in self.accepted.items())
+        calls = ", ".join(f"{model} x{count}" for model, count in self.model_calls.items()) or "none"
+        return (f"Model cascade: {total} lead(s) accepted at ({tiers}); escalation rate "
+                f"{escalated / total:.0%}; extra model calls: {calls}")
+
+cascade_stats = CascadeStats()
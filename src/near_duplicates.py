@@ -0,0 +1,124 @@
+import re
+import hashlib
+
+# --- 1. Settings ---
+# MinHash signatures over word shingles, indexed with LSH banding. Syndicated copies of the
+# same story (same text, different URL or section path) end up in the same cluster without
+# any model calls, and each lookup only touches the articles sharing a band bucket.
+NUM_PERMUTATIONS = 64
+BANDS = 16                  # 16 bands x 4 rows: pairs above ~0.5 Jaccard become candidates
+SHINGLE_SIZE = 3
+SIMILARITY_THRESHOLD = 0.7  # candidates must agree on this share of the signature
+
+# News API noise that differs between syndicated copies of one story
+BOILERPLATE_PATTERNS = [
+    re.compile(r"\[\+?\d+ chars\]"),
+    re.compile(r"get latest news on .*? only on \S+", re.IGNORECASE),
+]
+
+# --- 2. Signatures ---
+def article_text(article):
+    text = " ".join(article.get(field) or "" for field in ("title", "description", "content"))
+    for pattern in BOILERPLATE_PATTERNS:
+        text = pattern.sub(" ", text)
+    return text.lower()
+
+def shingles(text, size=SHINGLE_SIZE):
+    words = re.findall(r"[a-z0-9]+", text)
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+# One-permutation MinHash: each shingle is hashed once and lands in one of the bins, which
+# keeps the cost linear in the article length instead of NUM_PERMUTATIONS x shingles.
+def minhash_signature(article):
+    bins = [None] * NUM_PERMUTATIONS
+    for shingle in shingles(article_text(article)):
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        slot, value = h % NUM_PERMUTATIONS, h // NUM_PERMUTATIONS
+        if bins[slot] is None or value < bins[slot]:
+            bins[slot] = value
+    if all(value is None for value in bins):
+        return None
+    # Densify: an empty bin borrows the nearest non-empty bin to its right (wrapping round),
+    # tagged with the distance so borrowed values don't collide with real ones
+    signature = []
+    for slot in range(NUM_PERMUTATIONS):
+        distance = 0
+        while bins[(slot + distance) % NUM_PERMUTATIONS] is None:
+            distance += 1
+        signature.append((bins[(slot + distance) % NUM_PERMUTATIONS], distance))
+    return tuple(signature)
+
+def signature_similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+# "Richest" copy = the one with the most text. Truncated API content carries a
+# "[2376 chars]" marker with the full length, which counts too.
+def richness(article):
+    score = sum(len(article.get(field) or "") for field in ("title", "description", "content"))
+    declared = re.search(r"\[\+?(\d+) chars\]", article.get("content") or "")
+    if declared:
+        score += int(declared.group(1))
+    return score
+
+# --- 3. LSH index ---
+class NearDuplicateIndex:
+    def __init__(self, bands=BANDS, threshold=SIMILARITY_THRESHOLD):
+        self.bands = bands
+        self.rows = NUM_PERMUTATIONS // bands
+        self.threshold = threshold
+        self.buckets = {}
+        self.signatures = []
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    # Returns the ids of already-indexed items that look like near-duplicates of `signature`
+    def query(self, signature):
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        return [item for item in candidates
+                if signature_similarity(signature, self.signatures[item]) >= self.threshold]
+
+    def add(self, signature):
+        item = len(self.signatures)
+        self.signatures.append(signature)
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, []).append(item)
+        return item
+
+# --- 4. Collapse clusters ---
+# Keeps one lead per cluster (the richest member) at the position where the story first
+# appeared, and lists the other copies' URLs under `duplicates`.
+def collapse_near_duplicates(leads, threshold=SIMILARITY_THRESHOLD):
+    index = NearDuplicateIndex(threshold=threshold)
+    cluster_of_item = []
+    clusters = []  # each cluster is a list of lead positions
+
+    for position, lead in enumerate(leads):
+        signature = minhash_signature(lead)
+        if signature is None:
+            clusters.append([position])
+            continue
+        matches = index.query(signature)
+        item = index.add(signature)
+        if matches:
+            cluster = cluster_of_item[matches[0]]
+            clusters[cluster].append(position)
+        else:
+            cluster = len(clusters)
+            clusters.append([position])
+        cluster_of_item.append(cluster)
+
+    collapsed = []
+    for members in clusters:
+        best = max(members, key=lambda position: richness(leads[position]))
+        lead = dict(leads[best])
+        others = [leads[position].get("url") for position in members if position != best]
+        if others:
+            lead["duplicates"] = sorted(set(lead.get("duplicates", []) + others))
+        collapsed.append(lead)
+    return collapsed
@@ -1,6 +1,10 @@
 import os
+import argparse
 from openai import OpenAI
 from dotenv import load_dotenv
+from response_cache import add_cache_arguments, configure_cache, cache, cache_summary
+from api_calls import chat_completion
+from telemetry import add_telemetry_arguments, configure_telemetry, telemetry, telemetry_summary
 
 # --- 1. Load Environment Variables ---
 # This line loads the OPENAI_API_KEY from your .env file
@@ -8,12 +12,13 @@ load_dotenv()
 
 # --- 2. Initialize the OpenAI Client ---
 # This sets up the connection to OpenAI using your API key
-try:
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-except Exception as e:
-    print(f"Error initializing OpenAI client: {e}")
-    print("Please make sure your OPENAI_API_KEY is set correctly in the .env file.")
-    exit()
+# (the pipeline runner builds one client and shares it between phases)
+def create_client():
+    # Retries are handled by our own rate limiter (api_calls / rate_limiter), not the SDK
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+# Where the summary is saved for Phase 2
+SUMMARY_PATH = "phase1_summary.txt"
 
 # --- 3. Read the Greyamp Context File ---
 # This function reads the content of your greyamp_context.txt file
@@ -46,34 +51,60 @@ def create_prompt(context):
     """
     return prompt
 
-# --- 5. Main execution block ---
+# --- 5. Ask the LLM for the summary (rate-limited, retried on 429/5xx) ---
+def summarise_context(client, context):
+    analysis_prompt = create_prompt(context)
+    return chat_completion(
+        client,
+        model="gpt-4o-mini",  # Recommended gpt-4o. You can also use "gpt-3.5-turbo"
+        messages=[
+            {"role": "system", "content": "You are a helpful business analysis assistant."},
+            {"role": "user", "content": analysis_prompt}
+        ]
+    )
+
+# Save the summary so Phase 2 can pick it up (no more copy-pasting)
+def save_summary(summary, filepath=SUMMARY_PATH):
+    with open(filepath, "w") as f:
+        f.write(summary)
+
+# --- 6. Main execution block ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Phase 1: summarise Greyamp's context document.")
+    add_cache_arguments(parser)
+    add_telemetry_arguments(parser)
+    args = parser.parse_args()
+    configure_cache(args)
+    configure_telemetry(args, "phase1")
+
+    try:
+        client = create_client()
+    except Exception as e:
+        print(f"Error initializing OpenAI client: {e}")
+        print("Please make sure your OPENAI_API_KEY is set correctly in the .env file.")
+        exit()
+
     print("Starting Phase 1: Analyzing Greyamp's DNA...")
 
     # Read the context
     greyamp_context = read_context_file()
 
     if greyamp_context:
-        # Create the prompt
-        analysis_prompt = create_prompt(greyamp_context)
-
         print("Sending context to the LLM for analysis...")
 
-        # Make the API call to the LLM
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",  # Recommended gpt-4o. You can also use "gpt-3.5-turbo"
-                messages=[
-                    {"role": "system", "content": "You are a helpful business analysis assistant."},
-                    {"role": "user", "content": analysis_prompt}
-                ]
-            )
-
-            # Extract and print the LLM's response
-            summary = response.choices[0].message.content
+            summary = summarise_context(client, greyamp_context)
+            save_summary(summary)
+
+            # Print the LLM's response
             print("\n--- LLM Analysis Complete ---")
             print(summary)
-            print("\nPhase 1 successfully completed. This summary is the foundation for Phase 2.")
+            print(f"\nPhase 1 successfully completed. Summary saved to '{SUMMARY_PATH}' for Phase 2.")
 
         except Exception as e:
-            print(f"\nAn error occurred during the API call: {e}")
\ No newline at end of file
+            print(f"\nAn error occurred during the API call: {e}")
+
+    print(cache_summary())
+    print(telemetry_summary())
+    cache.close()
+    telemetry.close()
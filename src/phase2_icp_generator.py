@@ -1,32 +1,25 @@
-import os
+import argparse
 import json
-from openai import OpenAI
 from dotenv import load_dotenv
+from response_cache import add_cache_arguments, configure_cache, cache, cache_summary
+from api_calls import chat_completion
+from telemetry import add_telemetry_arguments, configure_telemetry, telemetry, telemetry_summary
+from phase1_strategist import SUMMARY_PATH, create_client
 
 # --- 1. Setup ---
-# Load environment variables and initialize the OpenAI client
+# Load environment variables; the OpenAI client comes from Phase 1's create_client()
 load_dotenv()
-try:
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-except Exception as e:
-    print(f"Error initializing OpenAI client: {e}")
-    exit()
+ICP_PATH = "icp_profiles.json"
 
 # --- 2. Input from Phase 1 ---
-# PASTE THE SUMMARY FROM YOUR PHASE 1 SCRIPT RUN HERE
-phase1_summary = """
-**1. What is Greyamp's core business and value proposition?**
-Greyamp Consulting is a transformation and digital solutions firm specializing in AI-first products and agentic solutions aimed at enhancing sales, marketing, and client engagement. Their value proposition lies in applying cutting-edge technology to address real-world business challenges, particularly within B2B sales processes.
-
-**2. Who are their typical customers (industries, company type)?**
-Greyamp primarily serves leading enterprises across various industries, including:
-   - Telecommunications (e.g., Axiata Digital)
-   - Financial Services & Insurance (e.g., HDFC Life, CUNA Mutual)
-   - Retail & E-commerce
-   
-**3. What specific business problems do they solve for these customers?**
-Greyamp solves problems related to legacy system modernization, building new user-centric digital products, automating software delivery through DevOps, and leveraging data and AI to accelerate business processes like sales and marketing. Greyamp helps customers modernize outdated systems, develop new digital products for customer engagement, and leverage AI to enhance business processes. Their solutions focus on delivering incremental value through a collaborative co-creation model and a Lean-Agile methodology.
-"""
+# Phase 1 saves its summary to phase1_summary.txt
+def load_phase1_summary(filepath=SUMMARY_PATH):
+    try:
+        with open(filepath, 'r') as file:
+            return file.read()
+    except FileNotFoundError:
+        print(f"Error: '{filepath}' not found. Please run phase1_strategist.py first.")
+        return None
 
 # --- 3. The Master Prompt for Phase 2 ---
 # This prompt instructs the LLM to act as a Chief Strategy Officer
@@ -54,41 +47,65 @@ def create_icp_prompt(summary):
     """
     return prompt
 
-# --- 4. Main execution block ---
+# --- 4. Generate the ICPs (rate-limited, retried on 429/5xx) ---
+def generate_icps(client, summary):
+    icp_generation_prompt = create_icp_prompt(summary)
+    json_response_str = chat_completion(
+        client,
+        model="gpt-4o-mini",
+        response_format={"type": "json_object"}, # This forces the output to be valid JSON
+        messages=[
+            {"role": "system", "content": "You are a helpful business strategy assistant that outputs only valid JSON."},
+            {"role": "user", "content": icp_generation_prompt}
+        ]
+    )
+    # Convert the JSON string into a Python dictionary
+    return json.loads(json_response_str)
+
+# Save the ICPs to a file for the next phase
+def save_icps(icp_data, filepath=ICP_PATH):
+    with open(filepath, "w") as f:
+        json.dump(icp_data, f, indent=2)
+
+# --- 5. Main execution block ---
 if __name__ == "__main__":
-    print("Starting Phase 2: Generating ICP Hypothesis...")
+    parser = argparse.ArgumentParser(description="Phase 2: generate ICPs from the Phase 1 summary.")
+    add_cache_arguments(parser)
+    add_telemetry_arguments(parser)
+    args = parser.parse_args()
+    configure_cache(args)
+    configure_telemetry(args, "phase2")
+
+    try:
+        client = create_client()
+    except Exception as e:
+        print(f"Error initializing OpenAI client: {e}")
+        exit()
 
-    icp_generation_prompt = create_icp_prompt(phase1_summary)
+    print("Starting Phase 2: Generating ICP Hypothesis...")
 
-    print("Sending request to the LLM to generate ICPs...")
+    phase1_summary = load_phase1_summary()
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            response_format={"type": "json_object"}, # This forces the output to be valid JSON
-            messages=[
-                {"role": "system", "content": "You are a helpful business strategy assistant that outputs only valid JSON."},
-                {"role": "user", "content": icp_generation_prompt}
-            ]
-        )
+    if phase1_summary:
+        print("Sending request to the LLM to generate ICPs...")
 
-        # Extract the JSON string from the response
-        json_response_str = response.choices[0].message.content
+        try:
+            icp_data = generate_icps(client, phase1_summary)
 
-        # Convert the JSON string into a Python dictionary
-        icp_data = json.loads(json_response_str)
+            print("\n--- LLM Strategy Complete: ICPs Generated ---")
 
-        print("\n--- LLM Strategy Complete: ICPs Generated ---")
+            # Pretty-print the JSON to make it readable
+            print(json.dumps(icp_data, indent=2))
 
-        # Pretty-print the JSON to make it readable
-        print(json.dumps(icp_data, indent=2))
+            save_icps(icp_data)
 
-        # Save the ICPs to a file for the next phase
-        with open("icp_profiles.json", "w") as f:
-            json.dump(icp_data, f, indent=2)
+            print(f"\nPhase 2 successfully completed. ICPs saved to '{ICP_PATH}'.")
+            print("This file will be the input for our 'Scout' Agent in Phase 3.")
 
-        print("\nPhase 2 successfully completed. ICPs saved to 'icp_profiles.json'.")
-        print("This file will be the input for our 'Scout' Agent in Phase 3.")
+        except Exception as e:
+            print(f"\nAn error occurred: {e}")
 
-    except Exception as e:
-        print(f"\nAn error occurred: {e}")
\ No newline at end of file
+    print(cache_summary())
+    print(telemetry_summary())
+    cache.close()
+    telemetry.close()
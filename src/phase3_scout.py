@@ -1,13 +1,43 @@
 import os
+import argparse
 import json
 import requests
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from response_cache import add_cache_arguments, configure_cache, cache, cache_summary
+from api_calls import http_get_json
+from near_duplicates import collapse_near_duplicates, minhash_signature, NearDuplicateIndex, SIMILARITY_THRESHOLD
+from jsonl_stream import JsonlWriter, clear_done, mark_done
+from lead_index import LeadIndex
+from vector_index import VectorIndex, IcpRanker
+from telemetry import add_telemetry_arguments, configure_telemetry, telemetry, telemetry_summary, tagged
 
 # --- 1. Setup ---
 # Load environment variables from .env file
 load_dotenv()
 GNEWS_API_KEY = os.getenv("GNEWS_API_KEY")
 NEWSAPI_KEY = os.getenv("NEWSAPI_KEY") # Load the NewsAPI key
+# Endpoints can be pointed at a local stub server for testing
+GNEWS_API_URL = os.getenv("GNEWS_API_URL", "https://gnews.io/api/v4/search")
+NEWSAPI_API_URL = os.getenv("NEWSAPI_API_URL", "https://newsapi.org/v2/everything")
+# Append-only handoff file read by Phase 4
+RAW_LEADS_PATH = "raw_leads.jsonl"
+
+# Scout engine defaults (overridable on the command line)
+DEFAULT_WORKERS = int(os.getenv("SCOUT_WORKERS", "8"))
+DEFAULT_PAGE_SIZE = int(os.getenv("SCOUT_PAGE_SIZE", "10"))
+DEFAULT_MAX_ARTICLES_PER_QUERY = int(os.getenv("SCOUT_MAX_ARTICLES_PER_QUERY", "10"))
+
+# One pooled keep-alive session shared by every request, instead of a new
+# connection (and TLS handshake) per call
+def create_http_session(pool_size=DEFAULT_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 4))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 # --- 2. Function to load ICPs from file ---
 def load_icps(filepath="icp_profiles.json"):
@@ -22,8 +52,10 @@ def load_icps(filepath="icp_profiles.json"):
         return None
 
 # --- 3. GNews Search Function ---
-def search_gnews(icp):
-    print(f"\n📰 Searching GNews for signals for ICP: {icp.get('icp_name', 'Unnamed ICP')}...")
+# Both search functions return None (not an empty list) when the request failed, so the
+# scout can tell "nothing more to fetch" from "didn't get an answer"
+def search_gnews(icp, page=1, page_size=DEFAULT_PAGE_SIZE, session=None, since=None):
+    print(f"\n📰 Searching GNews for signals for ICP: {icp.get('icp_name', 'Unnamed ICP')} (page {page})...")
     if not GNEWS_API_KEY:
         print("   ❌ GNews API Key not found. Skipping.")
         return []
@@ -34,21 +66,30 @@ def search_gnews(icp):
     query = f'({industry}) AND "AI"'
     
     print(f"   Constructed Query: {query}")
-    url = f"https://gnews.io/api/v4/search?q={query}&lang=en&country=in&max=10&token={GNEWS_API_KEY}"
+    params = {
+        'q': query,
+        'lang': 'en',
+        'country': 'in',
+        'max': page_size,
+        'page': page,
+        'token': GNEWS_API_KEY
+    }
+    # Incremental runs only ask for articles published since the last one we saw
+    if since:
+        params['from'] = since
     
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        articles = response.json().get("articles", [])
+        # Rate-limited, retried on 429/5xx (honours Retry-After)
+        articles = http_get_json("gnews", GNEWS_API_URL, params, session).get("articles", [])
         print(f"   ✅ Found {len(articles)} potential articles from GNews.")
         return articles
     except requests.exceptions.RequestException as e:
         print(f"   ❌ Error fetching from GNews: {e}")
-        return []
+        return None
 
 # --- 4. NewsAPI.org Search Function ---
-def search_newsapi(icp):
-    print(f"\n📰 Searching NewsAPI.org for signals for ICP: {icp.get('icp_name', 'Unnamed ICP')}...")
+def search_newsapi(icp, page=1, page_size=DEFAULT_PAGE_SIZE, session=None, since=None):
+    print(f"\n📰 Searching NewsAPI.org for signals for ICP: {icp.get('icp_name', 'Unnamed ICP')} (page {page})...")
     if not NEWSAPI_KEY:
         print("   ❌ NewsAPI Key not found. Skipping.")
         return []
@@ -59,20 +100,21 @@ def search_newsapi(icp):
     query = f'({industry}) AND "AI"'
     
     print(f"   Constructed Query: {query}")
-    url = "https://newsapi.org/v2/everything"
     
     # --- REMOVED 'country': 'in' ---
     params = {
         'q': query,
         'language': 'en',
-        'pageSize': 10, 
+        'pageSize': page_size,
+        'page': page,
         'apiKey': NEWSAPI_KEY
     }
+    if since:
+        params['from'] = since
     
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        articles = response.json().get("articles", [])
+        # Rate-limited, retried on 429/5xx (honours Retry-After)
+        articles = http_get_json("newsapi", NEWSAPI_API_URL, params, session).get("articles", [])
         print(f"   ✅ Found {len(articles)} potential articles from NewsAPI.")
         
         # --- Data Standardization ---
@@ -95,47 +137,218 @@ def search_newsapi(icp):
         
     except requests.exceptions.RequestException as e:
         print(f"   ❌ Error fetching from NewsAPI: {e}")
-        return []
+        return None
+
+# --- 5. Parallel scout engine ---
+SOURCES = [("gnews", search_gnews), ("newsapi", search_newsapi)]
+
+def _tagged_search(search, icp_profile, page, *args):
+    with tagged(icp=icp_profile.get("icp_name"), page=page):
+        return search(icp_profile, page, *args)
+
+# Fans out every (ICP x source) query at once on a shared thread pool and session. When a
+# page comes back full and that query's article budget isn't spent yet, the next page is
+# queued straight away, so pagination doesn't hold up the other queries. Every page is
+# requested at the same size (both APIs turn page number and size into an offset, so a
+# smaller last page would overlap the previous one); the last page is cut to the budget here.
+# `cursors` maps (icp name, source name) -> publishedAt of the newest article already seen.
+# Queries whose pagination ran out (a short last page, not the budget or a failed request)
+# are added to `exhausted` as (icp name, source name): only for those has everything since
+# the cursor been fetched.
+#
+# Pages are yielded as (icp_profile, source_name, articles) as soon as every page before them
+# (in ICP, then source, then page order) has arrived, so the output order is stable whatever
+# order the responses come back in, and downstream consumers can start early.
+# A caller-owned `session` (e.g. the pipeline's) is reused and left open.
+def run_scout_stream(icp_profiles, max_articles_per_query=DEFAULT_MAX_ARTICLES_PER_QUERY,
+                     page_size=DEFAULT_PAGE_SIZE, workers=DEFAULT_WORKERS, cursors=None, session=None,
+                     exhausted=None):
+    cursors = cursors or {}
+    page_size = max(1, min(page_size, max_articles_per_query))
+    owns_session = session is None
+    if owns_session:
+        session = create_http_session(workers)
+    queries = [(icp_index, source_index) for icp_index in range(len(icp_profiles))
+               for source_index in range(len(SOURCES))]
+    pages = {query: {} for query in queries}  # query -> {page: articles} waiting to be released
+    last_page = {}  # query -> final page number, once we know no more pages will be fetched
+    next_page = {query: 1 for query in queries}  # next page to release, per query
+    collected = {}  # query -> article count so far
+    released = 0  # queries[:released] are fully yielded
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {}  # future -> (query, page)
+
+        def submit(query, page):
+            icp_index, source_index = query
+            source_name, search = SOURCES[source_index]
+            icp_profile = icp_profiles[icp_index]
+            since = cursors.get((icp_profile.get("icp_name"), source_name))
+            # Worker threads don't inherit our context, so hand over the telemetry tags explicitly
+            future = pool.submit(contextvars.copy_context().run, _tagged_search, search, icp_profile,
+                                 page, page_size, session, since)
+            pending[future] = (query, page)
+
+        for query in queries:
+            submit(query, 1)
+
+        # Merge results as they arrive
+        while pending:
+            future = next(as_completed(pending))
+            query, page = pending.pop(future)
+            fetched = future.result()
+            articles = (fetched or [])[:max_articles_per_query - collected.get(query, 0)]
+            pages[query][page] = articles
+            collected[query] = collected.get(query, 0) + len(articles)
+            if fetched is not None and len(fetched) >= page_size and collected[query] < max_articles_per_query:
+                submit(query, page + 1)
+            else:
+                last_page[query] = page
+                if fetched is not None and len(fetched) < page_size and exhausted is not None:
+                    icp_index, source_index = query
+                    exhausted.add((icp_profiles[icp_index].get("icp_name"), SOURCES[source_index][0]))
+
+            # Release every page whose predecessors are all in
+            while released < len(queries):
+                current = queries[released]
+                while next_page[current] in pages[current]:
+                    icp_index, source_index = current
+                    yield icp_profiles[icp_index], SOURCES[source_index][0], pages[current].pop(next_page[current])
+                    next_page[current] += 1
+                if current in last_page and next_page[current] > last_page[current]:
+                    released += 1
+                else:
+                    break
+
+    if owns_session:
+        session.close()
 
-# --- 5. Main execution block (UPDATED with de-duplication) ---
+def add_scout_arguments(parser):
+    parser.add_argument("--dedup-threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="Similarity (0-1) above which two articles count as the same story.")
+    parser.add_argument("--max-articles-per-query", type=int, default=DEFAULT_MAX_ARTICLES_PER_QUERY,
+                        help="Article budget per (ICP, source); pages are followed until it is reached.")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help="Articles requested per page.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of queries in flight at the same time.")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the seen-article index and cursors, and rewrite raw_leads.jsonl from scratch.")
+    parser.add_argument("--no-icp-ranking", action="store_true",
+                        help="Keep matched_icp as the ICP whose query found the article, without vector scoring.")
+
+# --no-icp-ranking: leads keep the ICP whose query found them, with no icp_score
+def create_ranker(icp_data, args):
+    return None if args.no_icp_ranking else IcpRanker(icp_data, VectorIndex())
+
+# --- 6. New-lead stream: fan-out, de-duplication and incremental bookkeeping ---
+# Yields each new, de-duplicated lead as soon as its page is released. The articles on a
+# page are only marked seen once the caller has taken every lead from it (i.e. written
+# it out), and the cursors only move forward once the stream is exhausted, and only for the
+# queries that fetched everything since their cursor. Both APIs return newest first, so when
+# the article budget cut a query short, the older articles it didn't reach would be skipped
+# for good if its cursor moved to the newest one; it stays put and they're asked for again.
+def scout_new_leads(icp_profiles, args, index, stats, session=None, ranker=None):
+    cursors = {} if args.full else index.get_cursors()
+    story_index = NearDuplicateIndex(threshold=args.dedup_threshold)
+    # --- NEW: Add a set to track processed URLs ---
+    processed_urls = set()
+    newest = {}  # (icp name, source) -> newest publishedAt in this run
+    exhausted = set()  # (icp name, source) whose pagination ran out
+    stats.update({"new": 0, "already_seen": 0, "near_duplicates": 0})
+
+    # Query every ICP on every source (and page) concurrently
+    for icp_profile, source_name, articles in run_scout_stream(
+            icp_profiles, args.max_articles_per_query, args.page_size, args.workers, cursors, session, exhausted):
+        query = (icp_profile.get('icp_name'), source_name)
+
+        # --- NEW: Process and de-duplicate the page ---
+        page_leads = []
+        for lead in articles:
+            url = lead.get('url')
+            if lead.get('publishedAt'):
+                newest[query] = max(newest.get(query, ""), lead['publishedAt'])
+
+            # Only add the lead if we have a URL and we haven't seen it before (in this run or an earlier one)
+            if url and url not in processed_urls:
+                processed_urls.add(url) # Add the URL to our "memory"
+                if not args.full and index.is_seen(lead):
+                    stats["already_seen"] += 1
+                    continue
+                lead['matched_icp'] = icp_profile.get('icp_name')
+                page_leads.append(lead)
+
+        # Syndicated copies within the page collapse into their richest copy; copies of a
+        # story already handed out earlier in the run are dropped
+        collapsed = collapse_near_duplicates(page_leads, args.dedup_threshold)
+        stats["near_duplicates"] += len(page_leads) - len(collapsed)
+        fresh = []
+        for lead in collapsed:
+            signature = minhash_signature(lead)
+            if signature is not None:
+                if story_index.query(signature):
+                    stats["near_duplicates"] += 1
+                    continue
+                story_index.add(signature)
+            fresh.append(lead)
+
+        # Embed the page's new leads into the vector index and match each to its best ICP
+        if ranker is not None:
+            ranker.assign(fresh)
+        for lead in fresh:
+            stats["new"] += 1
+            yield lead
+
+        # Remember every article on this page (syndicated copies included)
+        index.mark_seen(page_leads)
+
+    for (icp_name, source_name), published_at in newest.items():
+        if (icp_name, source_name) in exhausted:
+            index.advance_cursor(icp_name, source_name, published_at)
+
+# --- 7. Main execution block (UPDATED with parallel fan-out, de-duplication, incremental runs and streaming output) ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Phase 3: scout news sources for raw leads.")
+    add_scout_arguments(parser)
+    add_cache_arguments(parser)
+    add_telemetry_arguments(parser)
+    args = parser.parse_args()
+    configure_cache(args)
+    configure_telemetry(args, "phase3")
+
     print("Starting Phase 3: The Multi-Source Scout Agent is hunting for leads...")
     icp_data = load_icps()
-    
-    # --- NEW: Add a set to track processed URLs ---
-    processed_urls = set()
-    all_raw_leads = []
 
     if icp_data and "ideal_customer_profiles" in icp_data:
-        # Correctly loop using the key from your JSON file
-        for icp_profile in icp_data["ideal_customer_profiles"]:
-            
-            # Call both search functions
-            gnews_leads = search_gnews(icp_profile)
-            newsapi_leads = search_newsapi(icp_profile)
-            
-            # Combine all leads from all sources
-            combined_leads = gnews_leads + newsapi_leads
-
-            # --- NEW: Process and de-duplicate the combined list ---
-            for lead in combined_leads:
-                url = lead.get('url')
-                
-                # Only add the lead if we have a URL and we haven't seen it before
-                if url and url not in processed_urls:
-                    lead['matched_icp'] = icp_profile.get('icp_name')
-                    all_raw_leads.append(lead)
-                    processed_urls.add(url) # Add the URL to our "memory"
-
-        # Save the de-duplicated leads to a file for Phase 4
-        with open("raw_leads.json", "w") as f:
-            json.dump(all_raw_leads, f, indent=2)
+        # --- NEW: Persistent memory of what earlier runs already fetched ---
+        index = LeadIndex()
+
+        # --- NEW: Leads are appended to raw_leads.jsonl one by one, so Phase 4 (--follow)
+        # can start on them while we're still scouting. The .done marker tells it we've finished.
+        clear_done(RAW_LEADS_PATH)
+        writer = JsonlWriter(RAW_LEADS_PATH, truncate=args.full)
+        stats = {}
+        ranker = create_ranker(icp_data, args)
+        for lead in scout_new_leads(icp_data["ideal_customer_profiles"], args, index, stats, ranker=ranker):
+            writer.write(lead)
+        writer.close()
+        index.close()
+        mark_done(RAW_LEADS_PATH)
 
+        print(f"\n🧬 Collapsed {stats['near_duplicates']} near-duplicate article(s) into their richest copy.")
+        if ranker is not None:
+            print(f"🧭 Re-matched {ranker.reassigned} lead(s) to a better-fitting ICP "
+                  f"({len(ranker.vectors)} article(s) in the vector index).")
         print("\n-------------------------------------------------")
         print("Phase 3 successfully completed!")
-        print(f"Found a total of {len(all_raw_leads)} unique raw leads from all sources.")
-        print("Results are saved in 'raw_leads.json'.")
+        print(f"Found a total of {stats['new']} new unique raw leads from all sources "
+              f"({stats['already_seen']} already seen earlier in this run or in earlier runs).")
+        print(f"Results are appended to '{RAW_LEADS_PATH}'.")
+        print(cache_summary())
+        print(telemetry_summary())
         print("-------------------------------------------------")
     else:
         print("Could not find valid ICP data to process.")
 
+    cache.close()
+    telemetry.close()
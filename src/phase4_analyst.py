@@ -1,158 +1,732 @@
 import os
 import json
-from openai import OpenAI
-from tavily import TavilyClient # <-- NEW IMPORT
+import socket
+import asyncio
+import argparse
+import multiprocessing
+import multiprocessing.connection
+from openai import AsyncOpenAI
+from tavily import AsyncTavilyClient
 from dotenv import load_dotenv
-import time
+from response_cache import add_cache_arguments, configure_cache, cache, cache_summary
+from api_calls import chat_completion_async, tavily_search_async
+from rate_limiter import set_budget_share
+from work_queue import WorkQueue, DEFAULT_LEASE_SECONDS
+from prompt_budget import compact_article, article_tokens, rank_snippets, count_tokens, prompt_stats
+from prefilter import PreFilter, DEFAULT_THRESHOLD as DEFAULT_PREFILTER_THRESHOLD, load_json
+from lead_index import LeadIndex, article_key
+from vector_index import fit_order
+from company_index import CompanyIndex, company_key, DEFAULT_FRESHNESS_DAYS
+from model_cascade import (lead_confidence, is_missing, parse_cascade, cascade_stats, DEFAULT_CASCADE,
+                           DEFAULT_TRIAGE_CONFIDENCE)
+from telemetry import add_telemetry_arguments, configure_telemetry, telemetry, telemetry_summary, set_tags
+from jsonl_stream import (JsonlReader, JsonlWriter, atomic_write_json, read_checkpoint,
+                          export_json_array, convert_json_array)
 
 # --- 1. Setup ---
 load_dotenv()
 # Load Tavily API key
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+# How many articles are analysed at the same time (can be overridden with --concurrency)
+DEFAULT_CONCURRENCY = int(os.getenv("PHASE4_CONCURRENCY", "8"))
+# Batched triage: up to N articles per gpt-4o-mini request, capped by an input-token budget
+# (--triage-batch-size 1 switches back to one request per article)
+DEFAULT_TRIAGE_BATCH_SIZE = int(os.getenv("PHASE4_TRIAGE_BATCH_SIZE", "10"))
+TRIAGE_BATCH_TOKEN_BUDGET = int(os.getenv("PHASE4_TRIAGE_BATCH_TOKENS", "6000"))
+# Result recorded for articles the local pre-filter rejected
+PREFILTER_REJECTION = {"company_name": "N/A", "summary": "Rejected by the local pre-filter."}
+# Streaming handoff: raw leads are read from Phase 3's JSONL file in windows, and qualified
+# leads are appended to a JSONL file as they're produced (then exported to qualified_leads.json)
+RAW_LEADS_PATH = "raw_leads.jsonl"
+QUALIFIED_LEADS_JSONL_PATH = "qualified_leads.jsonl"
+CHECKPOINT_PATH = "phase4_checkpoint.json"
+DEFAULT_WINDOW_SIZE = int(os.getenv("PHASE4_WINDOW_SIZE", "100"))
+DEFAULT_WINDOW_WAIT = float(os.getenv("PHASE4_WINDOW_WAIT", "5"))
+# Worker processes for --shards (see section 6b)
+DEFAULT_SHARDS = int(os.getenv("PHASE4_SHARDS", "1"))
+# What each enrichment search is looking for, used to rank the sentences of its results
+LOCATION_TERMS = ["headquarter", "based in", "office", "located", "campus", "india"]
+PEOPLE_TERMS = ["ceo", "cto", "founder", "chief", "chairman", "managing director", "president", "head of"]
+LEAD_FIELDS = ["company_name", "location_city", "key_person_name", "key_person_role", "qualifying_event_signal", "summary"]
 
-try:
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-except Exception as e:
-    print(f"Error initializing OpenAI client: {e}")
-    exit()
-
-if not TAVILY_API_KEY:
-    print("Error: TAVILY_API_KEY not found in .env file.")
-    exit()
-
-# Initialize the Tavily client
-try:
-    tavily = TavilyClient(api_key=TAVILY_API_KEY)
-except Exception as e:
-    print(f"Error initializing Tavily client: {e}")
-    exit()
-
-# --- 2. Function to load raw leads (No change) ---
-def load_raw_leads(filepath="raw_leads.json"):
-    try:
-        with open(filepath, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        print(f"Error: '{filepath}' not found. Please run phase3_scout.py first.")
-        return []
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from '{filepath}'.")
-        return []
-
-# --- 3. UPDATED: Tool for the Agent to use - Tavily Search API ---
-def search_tavily_for_details(query):
+# The async clients let many articles share one event loop instead of waiting on each other.
+# They're set by use_clients(), either from create_clients() or from the pipeline runner,
+# which shares one set of clients (and connection pools) across phases.
+client = None
+tavily = None
+
+def create_clients():
+    if not TAVILY_API_KEY:
+        raise RuntimeError("TAVILY_API_KEY not found in .env file.")
+    # Retries are handled by our own rate limiter (api_calls / rate_limiter), not the SDK
+    openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    # TAVILY_API_URL can point Tavily at a local stub server (see mock_providers.py)
+    tavily_client = AsyncTavilyClient(api_key=TAVILY_API_KEY, api_base_url=os.getenv("TAVILY_API_URL"))
+    return openai_client, tavily_client
+
+def use_clients(openai_client, tavily_client):
+    global client, tavily
+    client, tavily = openai_client, tavily_client
+
+# --- 2. UPDATED: Tool for the Agent to use - Tavily Search API (async) ---
+# Returns the raw result snippets (None if the search failed); enrich_company ranks and trims
+# them (see prompt_budget.py)
+async def search_tavily_for_details(query):
     print(f"   🔎 Using tool: Tavily Search for '{query}'")
     try:
-        # Use Tavily's search method
-        response = tavily.search(query=query, search_depth="basic", max_results=3)
+        # Use Tavily's search method (rate-limited, retried on 429/5xx)
+        response = await tavily_search_async(tavily, query=query, search_depth="basic", max_results=3)
         
         # Extract the content from the top 3 results
-        snippets = [result.get('content', '') for result in response.get('results', [])]
-        context = " ".join(snippets)
-        return context
+        return [result.get('content', '') for result in response.get('results', [])]
         
     except Exception as e:
         print(f"   -> Error during Tavily search: {e}")
-        return ""
+        return None
+
+# --- 3. The Master Prompt ---
+# The instructions come first and never change, so every request shares the same prefix
+# (and the provider can serve it from its prompt cache); the article and the enrichment
+# context, trimmed by prompt_budget.py, follow in the user message.
+ANALYSIS_INSTRUCTIONS = """You are an expert business analyst for an Indian B2B consultancy. Your task is to analyze the provided information and extract structured data about a single, specific company that is a high-quality sales lead.
+
+**CRITICAL INSTRUCTIONS:**
+1.  **Location Filter:** The primary company MUST have a significant presence or be headquartered in **India**. If the company is clearly foreign with no direct Indian operations mentioned, return "N/A" for `company_name`.
+2.  **Signal Quality Filter:** The `qualifying_event_signal` MUST be a tangible business or technology event (e.g., new product launch, partnership, funding, hiring spree, major investment). It should NOT be a stock recommendation, a product release for a different industry (like a comic book), or a generic market trend. If no such event is mentioned, return "N/A" for `company_name`.
+3.  Your goal is to identify **one primary company**. Do NOT use generic terms.
+4.  Combine information from BOTH sources to fill out the JSON below. If information is not found, use "N/A".
+
+**JSON Schema to follow:**
+- `company_name`: The name of the primary company discussed.
+- `location_city`: The specific city in India where the company is headquartered or has a major office.
+- `key_person_name`: The name of a key executive (CEO, CTO, Founder, etc.).
+- `key_person_role`: The job title of that key executive.
+- `qualifying_event_signal`: A concise, one-sentence summary of the tangible AI-related business event.
+- `summary`: A brief summary of the original news article's content."""
 
-# --- 4. The Master Prompt (No change) ---
 def create_analysis_prompt(article, enriched_context=""):
-    prompt = f"""
-    You are an expert business analyst for an Indian B2B consultancy. Your task is to analyze the provided information and extract structured data about a single, specific company that is a high-quality sales lead.
-
-    **Primary Information (from news article):**
-    ---
-    - Title: "{article.get('title', 'N/A')}"
-    - Description: "{article.get('description', 'N/A')}"
-    - Content Snippet: "{article.get('content', 'N/A')}"
-    ---
-
-    **Secondary Information (from a targeted Tavily search, if available):**
-    ---
-    {enriched_context}
-    ---
-
-    **CRITICAL INSTRUCTIONS:**
-    1.  **Location Filter:** The primary company MUST have a significant presence or be headquartered in **India**. If the company is clearly foreign with no direct Indian operations mentioned, return "N/A" for `company_name`.
-    2.  **Signal Quality Filter:** The `qualifying_event_signal` MUST be a tangible business or technology event (e.g., new product launch, partnership, funding, hiring spree, major investment). It should NOT be a stock recommendation, a product release for a different industry (like a comic book), or a generic market trend. If no such event is mentioned, return "N/A" for `company_name`.
-    3.  Your goal is to identify **one primary company**. Do NOT use generic terms.
-    4.  Combine information from BOTH sources to fill out the JSON below. If information is not found, use "N/A".
-
-    **JSON Schema to follow:**
-    - `company_name`: The name of the primary company discussed.
-    - `location_city`: The specific city in India where the company is headquartered or has a major office.
-    - `key_person_name`: The name of a key executive (CEO, CTO, Founder, etc.).
-    - `key_person_role`: The job title of that key executive.
-    - `qualifying_event_signal`: A concise, one-sentence summary of the tangible AI-related business event.
-    - `summary`: A brief summary of the original news article's content.
-    """
+    compact = compact_article(article)
+    prompt_stats.add(article_tokens(article), article_tokens(compact))
+    prompt = f"""**Primary Information (from news article):**
+---
+- Title: "{compact['title']}"
+- Description: "{compact['description']}"
+- Content Snippet: "{compact['content']}"
+---
+
+**Secondary Information (from a targeted Tavily search, if available):**
+---
+{enriched_context}
+---"""
+    return prompt
+
+def create_analysis_messages(article, enriched_context=""):
+    return [
+        {"role": "system", "content": ANALYSIS_INSTRUCTIONS},
+        {"role": "user", "content": create_analysis_prompt(article, enriched_context)},
+    ]
+
+# --- 3b. Batched triage prompt: many articles, one verdict per article ---
+BATCH_TRIAGE_INSTRUCTIONS = """You are an expert business analyst for an Indian B2B consultancy. For EACH news article you are given (one JSON object per line), decide whether it describes a single, specific company that is a high-quality sales lead, and extract structured data about it.
+
+**CRITICAL INSTRUCTIONS (apply to every article independently):**
+1.  **Location Filter:** The primary company MUST have a significant presence or be headquartered in **India**. If the company is clearly foreign with no direct Indian operations mentioned, return "N/A" for `company_name`.
+2.  **Signal Quality Filter:** The `qualifying_event_signal` MUST be a tangible business or technology event (e.g., new product launch, partnership, funding, hiring spree, major investment). It should NOT be a stock recommendation, a product release for a different industry (like a comic book), or a generic market trend. If no such event is mentioned, return "N/A" for `company_name`.
+3.  Identify **one primary company** per article. Do NOT use generic terms. If information is not found, use "N/A".
+
+Your output MUST be a single JSON object with the key "verdicts": an array containing exactly one object per article, in any order, each with:
+- `id`: The article's id, copied exactly.
+- `company_name`: The name of the primary company discussed.
+- `location_city`: The specific city in India where the company is headquartered or has a major office.
+- `key_person_name`: The name of a key executive (CEO, CTO, Founder, etc.).
+- `key_person_role`: The job title of that key executive.
+- `qualifying_event_signal`: A concise, one-sentence summary of the tangible AI-related business event.
+- `summary`: A brief summary of the article's content."""
+
+def create_batch_triage_prompt(articles_by_id):
+    article_blocks = []
+    for article_id, article in articles_by_id.items():
+        compact = compact_article(article)
+        prompt_stats.add(article_tokens(article), article_tokens(compact))
+        article_blocks.append(json.dumps({"id": article_id, **compact}, ensure_ascii=False))
+    prompt = "**Articles (one JSON object per line):**\n---\n" + "\n".join(article_blocks) + "\n---"
     return prompt
 
-# --- 5. Main execution block (UPDATED to call new function) ---
+def create_batch_triage_messages(articles_by_id):
+    return [
+        {"role": "system", "content": BATCH_TRIAGE_INSTRUCTIONS},
+        {"role": "user", "content": create_batch_triage_prompt(articles_by_id)},
+    ]
+
+# Packs (index, article) pairs into batches of at most `batch_size` articles whose prompts
+# stay under the token budget. An article too large for any batch goes alone.
+def make_triage_batches(indexed_articles, batch_size, token_budget=TRIAGE_BATCH_TOKEN_BUDGET):
+    batches, current, current_tokens = [], [], 0
+    for index, article in indexed_articles:
+        # The article's trimmed text plus room for its verdict; the instructions are paid once per batch
+        tokens = article_tokens(compact_article(article)) + 150
+        if current and (len(current) >= batch_size or current_tokens + tokens > token_budget):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append((index, article))
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+# --- 4. Analysis stages (triage -> per-company enrichment -> final pass) ---
+# Stage 1: cheap gpt-4o-mini pass to find out whether the article names a specific company
+async def triage_article(article, label, semaphore):
+    set_tags(article_id=article_key(article), icp=article.get("matched_icp"))
+    # The semaphore caps how many requests are in flight at once
+    async with semaphore:
+        print(f"\n{label} Processing article: \"{article.get('title', 'Untitled')}\"")
+        try:
+            initial_response = await chat_completion_async(
+                client,
+                model="gpt-4o-mini",
+                response_format={"type": "json_object"},
+                messages=create_analysis_messages(article)
+            )
+            lead_data = json.loads(initial_response)
+        except Exception as e:
+            print(f"{label}     ❌ Error processing article: {e}")
+            return None
+
+        company_name = lead_data.get("company_name", "N/A")
+        if company_name == "N/A":
+            print(f"{label}  -> No specific company found. Skipping enrichment.")
+        else:
+            print(f"{label}  -> Initial company identified: {company_name}")
+        return lead_data
+
+# Stage 1 (batched): one gpt-4o-mini request for a whole batch. Articles whose verdict is
+# missing or malformed fall back to a single-article triage call.
+async def triage_batch(batch, labels, semaphore):
+    articles_by_id = {f"a{index}": article for index, article in batch}
+    set_tags(article_id=[article_key(article) for _, article in batch])
+    verdicts = {}
+    async with semaphore:
+        print(f"\n🗂️  Triaging {len(batch)} article(s) in one request ({labels[batch[0][0]]} to {labels[batch[-1][0]]})...")
+        try:
+            response = await chat_completion_async(
+                client,
+                model="gpt-4o-mini",
+                response_format={"type": "json_object"},
+                messages=create_batch_triage_messages(articles_by_id)
+            )
+            for verdict in json.loads(response).get("verdicts", []):
+                if isinstance(verdict, dict) and verdict.get("id") in articles_by_id \
+                        and isinstance(verdict.get("company_name"), str):
+                    verdicts[verdict["id"]] = {field: verdict.get(field, "N/A") for field in LEAD_FIELDS}
+        except Exception as e:
+            print(f"   ❌ Batch triage failed, falling back to single-article calls: {e}")
+
+    results = {}
+    fallbacks = []
+    for index, article in batch:
+        lead_data = verdicts.get(f"a{index}")
+        if lead_data is None:
+            fallbacks.append((index, article))
+            continue
+        label = labels[index]
+        company_name = lead_data["company_name"]
+        if company_name == "N/A":
+            print(f"{label}  -> No specific company found. Skipping enrichment.")
+        else:
+            print(f"{label}  -> Initial company identified: {company_name}")
+        results[index] = lead_data
+
+    if fallbacks:
+        print(f"   ↩️  {len(fallbacks)} article(s) missing from the batch verdicts, triaging them one by one.")
+        singles = await asyncio.gather(*[
+            triage_article(article, labels[index], semaphore) for index, article in fallbacks
+        ])
+        results.update(zip([index for index, _ in fallbacks], singles))
+    return results
+
+# Stage 2: Tavily enrichment, run once per company no matter how many articles mention it.
+# Only the sentences most relevant to the company and to what each search was after are
+# kept, within a per-search token budget.
+async def enrich_company(company_name, semaphore):
+    set_tags(company=company_name)
+    async with semaphore:
+        # The two Tavily lookups don't depend on each other, so run them side by side
+        location_snippets, people_snippets = await asyncio.gather(
+            search_tavily_for_details(f"{company_name} headquarters location India"),
+            search_tavily_for_details(f"{company_name} CEO CTO"),
+        )
+    # The lead is still analysed without a failed search's results, but the context isn't
+    # complete enough to be stored for reuse
+    complete = location_snippets is not None and people_snippets is not None
+    location_snippets, people_snippets = location_snippets or [], people_snippets or []
+    location_context = rank_snippets(location_snippets, company_name, LOCATION_TERMS)
+    people_context = rank_snippets(people_snippets, company_name, PEOPLE_TERMS)
+    prompt_stats.add(count_tokens(" ".join(location_snippets + people_snippets)),
+                     count_tokens(location_context + people_context))
+    full_enriched_context = f"Location search results: {location_context}\n"
+    full_enriched_context += f"People search results: {people_context}\n"
+    return full_enriched_context, complete
+
+# Stage 3: final pass over the article plus the (shared) enrichment context, on `model`
+async def finalize_article(article, label, enriched_context, semaphore, model="gpt-4o"):
+    set_tags(article_id=article_key(article), icp=article.get("matched_icp"))
+    async with semaphore:
+        print(f"{label}  -> Performing final analysis with enriched data ({model})...")
+        try:
+            final_response = await chat_completion_async(
+                client,
+                model=model,
+                response_format={"type": "json_object"},
+                messages=create_analysis_messages(article, enriched_context)
+            )
+            final_lead_data = json.loads(final_response)
+        except Exception as e:
+            print(f"{label}     ❌ Error processing article: {e}")
+            return None
+        print(f"{label}     ✅ Lead qualified and enriched.")
+        return final_lead_data
+
+# Stage 3 (cascade): keep the triage record if it's complete and backed by the article and
+# the enrichment context; otherwise try each tier in turn until one produces a record that
+# clears its threshold (the last tier is always accepted). See model_cascade.py.
+async def route_lead(article, label, triage_lead, enriched_context, semaphore, cascade, triage_confidence):
+    confidence, problems = lead_confidence(triage_lead, article, enriched_context)
+    if confidence >= triage_confidence:
+        print(f"{label}     ✅ Triage record is complete and consistent, no escalation needed.")
+        cascade_stats.accept("triage")
+        return triage_lead
+    for position, (model, min_confidence) in enumerate(cascade):
+        print(f"{label}  -> Escalating to {model} (confidence {confidence:.2f}: {', '.join(problems)})")
+        cascade_stats.called(model)
+        lead = await finalize_article(article, label, enriched_context, semaphore, model)
+        if lead is None:
+            return None
+        if position == len(cascade) - 1:
+            break
+        confidence, problems = lead_confidence(lead, article, enriched_context)
+        if confidence >= min_confidence:
+            break
+    cascade_stats.accept(model)
+    return lead
+
+# --- 5. Concurrent analysis engine ---
+# Each stage runs all of its work at once under the concurrency limit. The returned list is
+# aligned with the input: one result per article (None if it failed and should be retried
+# on a later run), whatever order the articles finish in.
+async def run_analysis(articles, concurrency=DEFAULT_CONCURRENCY, triage_batch_size=DEFAULT_TRIAGE_BATCH_SIZE,
+                       prefilter=None, cascade=None, triage_confidence=DEFAULT_TRIAGE_CONFIDENCE, companies=None):
+    cascade = cascade or parse_cascade(DEFAULT_CASCADE)
+    # Local, model-free pre-filter: implausible articles never reach the LLM
+    positions = list(range(len(articles)))
+    if prefilter is not None:
+        positions = [position for position in positions if prefilter.is_plausible(articles[position])]
+        print(f"🧹 Pre-filter (threshold {prefilter.threshold}) rejected {len(articles) - len(positions)} article(s) "
+              f"without any LLM call; {len(positions)} left to analyse.")
+    raw_leads = [articles[position] for position in positions]
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    total = len(raw_leads)
+    prompt_stats.leads += total
+    labels = [f"[{index}/{total}]" for index in range(1, total + 1)]
+
+    if triage_batch_size > 1:
+        batches = make_triage_batches(list(enumerate(raw_leads)), triage_batch_size)
+        print(f"Triaging {total} article(s) in {len(batches)} batched request(s).")
+        batch_results = await asyncio.gather(*[triage_batch(batch, labels, semaphore) for batch in batches])
+        triaged_by_index = {index: lead for results in batch_results for index, lead in results.items()}
+        triaged = [triaged_by_index.get(index) for index in range(total)]
+    else:
+        triaged = await asyncio.gather(*[
+            triage_article(article, label, semaphore) for article, label in zip(raw_leads, labels)
+        ])
+
+    # Group the surviving articles by company: by normalised name, e.g. the same DoT story
+    # under two URLs, or many Tech Mahindra / Jio articles, and with the company index by
+    # the known company each name resolves to (aliases and near-miss spellings included)
+    groups = {}
+    for index, lead_data in enumerate(triaged):
+        if lead_data is None or lead_data.get("company_name", "N/A") == "N/A":
+            continue
+        known = companies.resolve(lead_data["company_name"]) if companies is not None else None
+        key = known["company_key"] if known else company_key(lead_data["company_name"])
+        groups.setdefault(key, []).append(index)
+
+    # Enrich each company once, using the name from its first article for the searches;
+    # companies the index enriched within the freshness window need no searches at all
+    group_keys = list(groups)
+    context_by_company = {}
+    if companies is not None:
+        for key in group_keys:
+            context = companies.fresh_context(key)
+            if context is not None:
+                context_by_company[key] = context
+        companies.stats["reused"] += len(context_by_company)
+    to_enrich = [key for key in group_keys if key not in context_by_company]
+    enrichments = await asyncio.gather(*[
+        enrich_company(triaged[groups[key][0]]["company_name"], semaphore) for key in to_enrich
+    ])
+    for key, (context, complete) in zip(to_enrich, enrichments):
+        context_by_company[key] = context
+        if companies is not None:
+            companies.stats["enriched"] += 1
+            # Only a context from two successful searches may stand in for new ones later
+            if complete:
+                companies.record_enrichment(key, triaged[groups[key][0]]["company_name"], context)
+
+    enriched_articles = sum(len(indexes) for indexes in groups.values())
+    searches_saved = 2 * (enriched_articles - len(to_enrich))
+    tokens_reused = sum(
+        count_tokens(context_by_company[key]) * (len(indexes) - (key in to_enrich))
+        for key, indexes in groups.items()
+    )
+    print(f"\n🏢 {enriched_articles} article(s) name {len(groups)} distinct companies "
+          f"({len(group_keys) - len(to_enrich)} already enriched in the company index): "
+          f"saved {searches_saved} Tavily search(es) and ~{tokens_reused} enrichment tokens by reusing results.")
+
+    company_by_index = {index: key for key, indexes in groups.items() for index in indexes}
+    finals = await asyncio.gather(*[
+        route_lead(raw_leads[index], labels[index], triaged[index], context_by_company[key], semaphore,
+                   cascade, triage_confidence)
+        for index, key in company_by_index.items()
+    ])
+    final_by_index = dict(zip(company_by_index, finals))
+
+    # Merge each qualified lead into its company record (canonical name, new aliases, signal)
+    if companies is not None:
+        for index, lead_data in final_by_index.items():
+            if lead_data is not None and not is_missing(lead_data.get("company_name")):
+                final_by_index[index] = companies.merge_lead(company_by_index[index], lead_data,
+                                                             article_key(raw_leads[index]))
+
+    results = [PREFILTER_REJECTION] * len(articles)
+    for index, lead_data in enumerate(triaged):
+        results[positions[index]] = final_by_index.get(index, lead_data)
+    return results
+
+# --- 6. Streaming driver: read raw_leads.jsonl window by window ---
+# Each window is analysed, its qualified leads appended (and fsynced) to qualified_leads.jsonl,
+# marked analysed in the index, and only then is the checkpoint moved past it. A crash at
+# any point loses at most the window in flight; a crash after the write but before the
+# index update means the window is analysed and written again, and the export keeps one
+# copy per article (article_id). The checkpoint only advances over windows
+# with no failed articles, so failures are picked up again by the next run.
+# `reader` is anything with read_batch() / finished / checkpoint(): a JsonlReader here, or the
+# pipeline's in-memory queue (which passes checkpoint_path=None).
+async def stream_analysis(reader, writer, index, args, prefilter=None, skip_analysed=True,
+                          checkpoint_path=CHECKPOINT_PATH, companies=None):
+    totals = {"read": 0, "skipped": 0, "processed": 0, "qualified": 0, "failed": 0}
+    clean_prefix = True
+    while not reader.finished:
+        window = await asyncio.to_thread(reader.read_batch, args.window_size, args.window_wait)
+        totals["read"] += len(window)
+        if skip_analysed:
+            pending = [article for article in window if not index.is_analysed(article)]
+            totals["skipped"] += len(window) - len(pending)
+        else:
+            pending = window
+
+        if pending:
+            print(f"\n📥 Window of {len(window)} raw lead(s): {len(pending)} to analyse "
+                  f"(concurrency: {args.concurrency}).")
+            results = await run_analysis(pending, args.concurrency, args.triage_batch_size, prefilter,
+                                         cascade_from_args(args), triage_confidence_from_args(args), companies)
+
+            # --- NEW: Final Quality Filter ---
+            for article, lead in zip(pending, results):
+                if is_qualified(lead):
+                    writer.write(qualified_record(lead, article))
+                    totals["qualified"] += 1
+
+            # Failed articles stay un-analysed so the next run picks them up again
+            analysed = [article for article, result in zip(pending, results) if result is not None]
+            index.mark_analysed(analysed)
+            totals["processed"] += len(analysed)
+            totals["failed"] += len(pending) - len(analysed)
+            clean_prefix = clean_prefix and len(analysed) == len(pending)
+
+        if clean_prefix and checkpoint_path:
+            atomic_write_json(checkpoint_path, reader.checkpoint())
+    return totals
+
+# --- 6b. Sharded mode: one work queue, many worker processes ---
+# One asyncio loop is one core; --shards N spreads a backfill over N worker processes.
+# The coordinator queues every raw lead still to analyse (shard = hash of the article key,
+# see work_queue.py), starts one worker per shard and waits for the queue to drain,
+# restarting crashed workers, whose leased items go straight back to the queue. It then
+# writes the qualified leads in raw_leads.jsonl order, however the work was scheduled.
+# Workers on other machines sharing the queue file can join with --worker --shard K.
+def is_qualified(lead):
+    return lead is not None and bool(lead.get("company_name")) and lead.get("company_name") != "N/A"
+
+async def work_queue_items(queue, index, args, shard, worker, prefilter=None, companies=None):
+    totals = {"processed": 0, "qualified": 0, "failed": 0}
+
+    # Keeps this worker's leases alive while a window is being analysed
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(queue.lease_seconds / 3)
+            queue.renew(worker)
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        while True:
+            items = queue.lease(worker, args.window_size, shard)
+            if not items:
+                break
+            print(f"\n📥 [shard {shard}] Leased {len(items)} raw lead(s) (concurrency: {args.concurrency}).")
+            articles = [article for _, article in items]
+            results = await run_analysis(articles, args.concurrency, args.triage_batch_size, prefilter,
+                                         cascade_from_args(args), triage_confidence_from_args(args), companies)
+            finished, failed = {}, []
+            for (seq, article), lead in zip(items, results):
+                if lead is None:
+                    failed.append(seq)
+                else:
+                    finished[seq] = qualified_record(lead, article) if is_qualified(lead) else None
+            # Marked analysed before the results are handed in: a crash in between only
+            # means the window is analysed again, never that a result is lost
+            index.mark_analysed([article for (seq, article) in items if seq in finished])
+            queue.complete(worker, finished)
+            queue.fail(worker, failed)
+            totals["processed"] += len(finished)
+            totals["qualified"] += sum(1 for lead in finished.values() if lead is not None)
+            totals["failed"] += len(failed)
+    finally:
+        beat.cancel()
+    return totals
+
+# Entry point of a worker process (or of `--worker`): its own clients, indexes and event
+# loop, and 1/N of every API budget so N workers together stay within the limits
+def run_shard_worker(args, shard, worker):
+    configure_cache(args)
+    configure_telemetry(args, "phase4")
+    set_tags(shard=shard)
+    set_budget_share(1 / max(1, args.shards))
+    use_clients(*create_clients())
+    queue = WorkQueue(lease_seconds=args.lease_seconds)
+    index = LeadIndex()
+    companies = open_company_index(args)
+    prefilter = None if args.no_prefilter else PreFilter(load_json("icp_profiles.json", {}), args.prefilter_threshold)
+    try:
+        totals = asyncio.run(work_queue_items(queue, index, args, shard, worker, prefilter, companies))
+        print(f"\n✔️  [shard {shard}] Worker {worker} finished: {totals['processed']} analysed, "
+              f"{totals['qualified']} qualified, {totals['failed']} failed.")
+        print(f"[shard {shard}] {cascade_stats.summary()}")
+        print(f"[shard {shard}] {prompt_stats.summary()}")
+        if companies is not None:
+            print(f"[shard {shard}] {companies.summary()}")
+        print(f"[shard {shard}] {telemetry_summary(totals['qualified'])}")
+    finally:
+        queue.close()
+        index.close()
+        if companies is not None:
+            companies.close()
+        cache.close()
+        telemetry.close()
+
+def run_sharded(args, reader, writer, index):
+    totals = {"read": 0, "skipped": 0, "processed": 0, "qualified": 0, "failed": 0}
+    queue = WorkQueue(lease_seconds=args.lease_seconds)
+    if args.all:
+        queue.clear()
+    # Leads given up on last time were never marked analysed, so they're queued again below
+    queue.clear("failed")
+    while not reader.finished:
+        window = reader.read_batch(args.window_size, args.window_wait)
+        totals["read"] += len(window)
+        pending = window if args.all else [article for article in window if not index.is_analysed(article)]
+        totals["skipped"] += len(window) - len(pending)
+        queue.enqueue([(article_key(article), article) for article in pending], args.shards)
+    print(f"🗃️  Work queue: {queue.counts()} across {args.shards} shard(s).")
+
+    context = multiprocessing.get_context("spawn")
+    workers = {}  # sentinel -> (shard, worker id, process)
+    restarts = 0
+
+    def start_worker(shard):
+        worker = f"{socket.gethostname()}-{os.getpid()}-s{shard}-{restarts}"
+        process = context.Process(target=run_shard_worker, args=(args, shard, worker))
+        process.start()
+        workers[process.sentinel] = (shard, worker, process)
+
+    if queue.has_work():
+        for shard in range(args.shards):
+            start_worker(shard)
+    while workers:
+        for sentinel in multiprocessing.connection.wait(list(workers)):
+            shard, worker, process = workers.pop(sentinel)
+            process.join()
+            if process.exitcode == 0:
+                continue
+            released = queue.release_worker(worker)
+            print(f"⚠️  Worker for shard {shard} exited with code {process.exitcode}; "
+                  f"{released} leased lead(s) back in the queue.")
+            if queue.has_work() and restarts < args.shards * queue.max_attempts:
+                restarts += 1
+                start_worker(shard)
+
+    # Merge: every finished result, in raw_leads.jsonl order
+    done_by_worker = queue.done_by_worker()
+    for _, lead in queue.done_results():
+        writer.write(lead)
+        totals["qualified"] += 1
+    totals["processed"] = sum(done_by_worker.values())
+    queue.clear("done")
+    counts = queue.counts()
+    totals["failed"] = sum(counts.values())
+    print(f"\n🧩 Merged results from {len(done_by_worker)} worker(s): "
+          + ", ".join(f"{worker} {count}" for worker, count in done_by_worker.items()))
+    if counts.get("leased"):
+        print(f"⏳ {counts['leased']} lead(s) are still leased by workers elsewhere; run again to merge them.")
+    queue.close()
+    return totals
+
+# The record written to qualified_leads.jsonl: the lead, the key of the article it came from
+# (so a window analysed twice after a crash is only exported once) and Phase 3's ICP match,
+# so leads can be ranked by fit
+def qualified_record(lead, article):
+    record = {**lead, "article_id": article_key(article)}
+    if article.get("icp_score") is not None:
+        record.update({"matched_icp": article.get("matched_icp"), "icp_score": article["icp_score"]})
+    return record
+
+# --no-cascade: skip straight to gpt-4o, never keeping the triage record
+def cascade_from_args(args):
+    return [("gpt-4o", 0.0)] if args.no_cascade else parse_cascade(args.cascade)
+
+def triage_confidence_from_args(args):
+    return float("inf") if args.no_cascade else args.triage_confidence
+
+# --no-company-index: resolve and enrich companies within this run only, as before
+def open_company_index(args):
+    return None if args.no_company_index else CompanyIndex(freshness_days=args.company_freshness_days)
+
+def add_sharding_arguments(parser):
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS,
+                        help="Split the run over this many worker processes sharing a work queue (1 = in-process).")
+    parser.add_argument("--worker", action="store_true",
+                        help="Only run one worker against an existing work queue (e.g. on another machine).")
+    parser.add_argument("--shard", type=int, default=0, help="With --worker, the shard this worker prefers.")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="How long a worker may hold leads without renewing before others take them over.")
+
+def add_analysis_arguments(parser):
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum number of articles analysed at the same time.")
+    parser.add_argument("--triage-batch-size", type=int, default=DEFAULT_TRIAGE_BATCH_SIZE,
+                        help="Articles per batched triage request (1 = one request per article).")
+    parser.add_argument("--prefilter-threshold", type=float, default=DEFAULT_PREFILTER_THRESHOLD,
+                        help="Minimum local relevance score for an article to reach the LLM.")
+    parser.add_argument("--no-prefilter", action="store_true",
+                        help="Send every article to the LLM, skipping the local pre-filter.")
+    parser.add_argument("--all", action="store_true",
+                        help="Re-analyse every raw lead and rewrite qualified_leads.json, not just the new ones.")
+    parser.add_argument("--cascade", default=DEFAULT_CASCADE,
+                        help="Escalation tiers after triage, as model:min_confidence pairs (last tier always accepted).")
+    parser.add_argument("--triage-confidence", type=float, default=DEFAULT_TRIAGE_CONFIDENCE,
+                        help="Confidence (0-1) at which the gpt-4o-mini triage record is kept as-is.")
+    parser.add_argument("--no-cascade", action="store_true",
+                        help="Always re-analyse enriched leads with gpt-4o (the old behaviour).")
+    parser.add_argument("--company-freshness-days", type=float, default=DEFAULT_FRESHNESS_DAYS,
+                        help="Reuse a known company's Tavily enrichment for this many days (0 = always search again).")
+    parser.add_argument("--no-company-index", action="store_true",
+                        help="Don't resolve companies against (or update) the persistent company index.")
+    parser.add_argument("--window-size", type=int, default=DEFAULT_WINDOW_SIZE,
+                        help="Raw leads read and analysed per window (bounds memory use).")
+    parser.add_argument("--window-wait", type=float, default=DEFAULT_WINDOW_WAIT,
+                        help="With --follow, seconds to wait for a window to fill before analysing a partial one.")
+
+# --- 7. Main execution block (UPDATED to use the async engine and the streaming handoff) ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Phase 4: qualify and enrich raw leads.")
+    add_analysis_arguments(parser)
+    parser.add_argument("--follow", action="store_true",
+                        help="Keep reading raw_leads.jsonl while Phase 3 is still writing it, until Phase 3 finishes.")
+    add_sharding_arguments(parser)
+    add_cache_arguments(parser)
+    add_telemetry_arguments(parser)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_shard_worker(args, args.shard, f"{socket.gethostname()}-{os.getpid()}")
+        exit()
+    if args.shards > 1 and args.follow:
+        print("Error: --follow can't be combined with --shards; run Phase 3 first.")
+        exit()
+
+    configure_cache(args)
+    configure_telemetry(args, "phase4")
+
+    try:
+        use_clients(*create_clients())
+    except Exception as e:
+        print(f"Error initializing API clients: {e}")
+        exit()
+
     print("Starting Phase 4: The Super-Analyst is qualifying and enriching leads (using Tavily API)...")
-    raw_leads = load_raw_leads()
-    all_processed_leads = [] # We'll store all results here first
 
-    if not raw_leads:
-        print("No raw leads to process. Exiting.")
+    # One-off migration from the old whole-file handoff
+    if not os.path.exists(RAW_LEADS_PATH) and os.path.exists("raw_leads.json"):
+        migrated = convert_json_array("raw_leads.json", RAW_LEADS_PATH)
+        print(f"Converted {migrated} raw lead(s) from 'raw_leads.json' to '{RAW_LEADS_PATH}'.")
+    if not os.path.exists(RAW_LEADS_PATH) and not args.follow:
+        print(f"Error: '{RAW_LEADS_PATH}' not found. Please run phase3_scout.py first.")
+        cache.close()
+        exit()
+
+    # --- NEW: Only process the delta since the last run ---
+    index = LeadIndex()
+    # With no analysis history yet (or --all) this is a full run that starts fresh output files
+    incremental = not args.all and index.analysed_count() > 0
+    checkpoint = read_checkpoint(CHECKPOINT_PATH) if incremental else {}
+    offset = checkpoint.get("offset", 0)
+    if offset:
+        print(f"Resuming from byte {offset} of '{RAW_LEADS_PATH}'.")
+
+    reader = JsonlReader(RAW_LEADS_PATH, offset=offset, follow=args.follow, fingerprint=checkpoint.get("fingerprint"))
+    writer = JsonlWriter(QUALIFIED_LEADS_JSONL_PATH, truncate=not incremental)
+    # In sharded mode every worker opens its own
+    prefilter, companies = None, None
+    if args.shards <= 1:
+        prefilter = None if args.no_prefilter else PreFilter(load_json("icp_profiles.json", {}), args.prefilter_threshold)
+        companies = open_company_index(args)
+
+    if args.shards > 1:
+        totals = run_sharded(args, reader, writer, index)
+        if not totals["failed"]:
+            atomic_write_json(CHECKPOINT_PATH, reader.checkpoint())
     else:
-        print(f"Found {len(raw_leads)} raw lead(s) to analyze.")
-
-        for article in raw_leads:
-            print(f"\nProcessing article: \"{article.get('title', 'Untitled')}\"")
-
-            initial_prompt = create_analysis_prompt(article)
-            try:
-                initial_response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    response_format={"type": "json_object"},
-                    messages=[{"role": "user", "content": initial_prompt}]
-                )
-                lead_data = json.loads(initial_response.choices[0].message.content)
-                company_name = lead_data.get("company_name", "N/A")
-
-                if company_name != "N/A":
-                    print(f"  -> Initial company identified: {company_name}")
-                    full_enriched_context = ""
-                    
-                    # Call the new Tavily search function
-                    location_context = search_tavily_for_details(f"{company_name} headquarters location India")
-                    full_enriched_context += f"Location search results: {location_context}\\n"
-                    time.sleep(1) # It's still good practice to add a small delay
-
-                    # Call the new Tavily search function
-                    people_context = search_tavily_for_details(f"{company_name} CEO CTO")
-                    full_enriched_context += f"People search results: {people_context}\\n"
-                    
-                    print("  -> Performing final analysis with enriched data...")
-                    final_prompt = create_analysis_prompt(article, full_enriched_context)
-                    final_response = client.chat.completions.create(
-                        model="gpt-4o",
-                        response_format={"type": "json_object"},
-                        messages=[{"role": "user", "content": final_prompt}]
-                    )
-                    final_lead_data = json.loads(final_response.choices[0].message.content)
-                    all_processed_leads.append(final_lead_data)
-                    print("     ✅ Lead qualified and enriched.")
-                else:
-                    print("  -> No specific company found. Skipping enrichment.")
-                    all_processed_leads.append(lead_data)
+        totals = asyncio.run(stream_analysis(reader, writer, index, args, prefilter, skip_analysed=not args.all,
+                                             companies=companies))
+    reader.close()
+    writer.close()
 
-            except Exception as e:
-                print(f"     ❌ Error processing article: {e}")
+    # Downstream tools still read the JSON array, best ICP fit first
+    total_qualified = export_json_array(QUALIFIED_LEADS_JSONL_PATH, "qualified_leads.json", sort_key=fit_order,
+                                        unique_key="article_id")
 
-        # --- NEW: Final Quality Filter ---
-        final_qualified_leads = [
-            lead for lead in all_processed_leads if lead.get("company_name") and lead.get("company_name") != "N/A"
-        ]
-        
-        with open("qualified_leads.json", "w") as f:
-            json.dump(final_qualified_leads, f, indent=2)
+    print("\n=================================================")
+    print("Phase 4 successfully completed!")
+    print(f"Read {totals['read']} raw lead(s); skipped {totals['skipped']} already analysed in earlier runs.")
+    print(f"Saved {totals['qualified']} new high-quality, qualified leads to 'qualified_leads.json' "
+          f"({total_qualified} in total).")
+    print(f"(Filtered out {totals['processed'] - totals['qualified']} invalid or low-quality leads; "
+          f"{totals['failed']} failed and will be retried next run)")
+    if args.shards > 1:
+        print("(Model cascade, prompt, company index and telemetry summaries are printed by each shard above)")
+    else:
+        print(cascade_stats.summary())
+        print(prompt_stats.summary())
+        if companies is not None:
+            print(companies.summary())
+        print(cache_summary())
+        print(telemetry_summary(totals["qualified"]))
+    print("=================================================")
 
-        print("\n=================================================")
-        print("Phase 4 successfully completed!")
-        print(f"Saved {len(final_qualified_leads)} high-quality, qualified leads to 'qualified_leads.json'.")
-        print(f"(Filtered out {len(all_processed_leads) - len(final_qualified_leads)} invalid or low-quality leads)")
-        print("=================================================")
+    if companies is not None:
+        companies.close()
 
+    index.close()
+    cache.close()
+    telemetry.close()
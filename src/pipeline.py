@@ -0,0 +1,276 @@
+import os
+import time
+import queue
+import asyncio
+import hashlib
+import argparse
+from dotenv import load_dotenv
+from response_cache import add_cache_arguments, configure_cache, cache, cache_summary
+from lead_index import LeadIndex
+from vector_index import fit_order
+from prefilter import PreFilter
+from telemetry import add_telemetry_arguments, configure_telemetry, telemetry, telemetry_summary, set_tags
+from jsonl_stream import (JsonlReader, JsonlWriter, clear_done, mark_done, atomic_write_json, read_checkpoint,
+                          export_json_array)
+import phase1_strategist
+import phase2_icp_generator
+import phase3_scout
+import phase4_analyst
+
+# --- 1. Settings ---
+# One entry point for the whole run: Strategist -> ICP Generator -> Scout -> Analyst, in a
+# single process with one set of API clients. Results are passed in memory; files are still
+# written so each phase can also be run (or re-run) on its own.
+load_dotenv()
+STATE_PATH = ".pipeline_state.json"
+CONTEXT_PATH = "greyamp_context.txt"
+
+# --- 2. Shared clients & connection pools ---
+def create_shared_clients(workers):
+    openai_client = phase1_strategist.create_client()
+    async_openai_client, tavily_client = phase4_analyst.create_clients()
+    return {
+        "openai": openai_client,                 # Phases 1 & 2
+        "async_openai": async_openai_client,     # Phase 4
+        "tavily": tavily_client,                 # Phase 4
+        "http": phase3_scout.create_http_session(workers),  # Phase 3
+    }
+
+# --- 3. In-memory handoff from Scout to Analyst ---
+# Same read_batch() / finished interface as jsonl_stream.JsonlReader (no checkpoints), so Phase 4's
+# streaming driver can consume leads straight from the Scout thread.
+_END = object()
+
+class LeadQueue:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.finished = False
+        self.offset = None
+
+    def put(self, lead):
+        self.queue.put(lead)
+
+    def close(self):
+        self.queue.put(_END)
+
+    # Waits for the first lead, then hands back a partial window after `max_wait` seconds
+    def read_batch(self, max_records, max_wait=5.0):
+        records = []
+        deadline = time.monotonic() + max_wait
+        while len(records) < max_records and not self.finished:
+            timeout = max(0.0, deadline - time.monotonic()) if records else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _END:
+                self.finished = True
+                break
+            records.append(item)
+        return records
+
+# --- 4. Change detection ---
+# A stage is skipped when the fingerprint of its inputs matches the last successful run and
+# its output file is still there. --force re-runs everything.
+def fingerprint(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def load_state(filepath=STATE_PATH):
+    return read_checkpoint(filepath)
+
+# --- 5. Stages ---
+# Each stage receives the shared run context plus its dependencies' results, and returns
+# (result, status, input fingerprint). The result is handed to dependent stages in memory;
+# status is "ran" or "skipped" (inputs unchanged).
+async def run_strategist(run):
+    context = phase1_strategist.read_context_file(CONTEXT_PATH)
+    if context is None:
+        raise RuntimeError(f"'{CONTEXT_PATH}' is required for Phase 1.")
+    inputs = fingerprint(context)
+    if not run["args"].force and run["state"].get("strategist") == inputs \
+            and os.path.exists(phase1_strategist.SUMMARY_PATH):
+        return phase2_icp_generator.load_phase1_summary(), "skipped", inputs
+    summary = await asyncio.to_thread(phase1_strategist.summarise_context, run["clients"]["openai"], context)
+    phase1_strategist.save_summary(summary)
+    return summary, "ran", inputs
+
+async def run_icp_generator(run, summary):
+    inputs = fingerprint(summary)
+    if not run["args"].force and run["state"].get("icp_generator") == inputs \
+            and os.path.exists(phase2_icp_generator.ICP_PATH):
+        return phase3_scout.load_icps(phase2_icp_generator.ICP_PATH), "skipped", inputs
+    icp_data = await asyncio.to_thread(phase2_icp_generator.generate_icps, run["clients"]["openai"], summary)
+    phase2_icp_generator.save_icps(icp_data)
+    return icp_data, "ran", inputs
+
+# Raw leads from earlier runs that never got analysed (they failed, or the Analyst stage didn't
+# finish). The Scout has marked them seen, so they only reach the Analyst from the file: read
+# from the Phase 4 checkpoint, like a standalone Phase 4 run, before the Scout appends to it.
+def queue_backlog(args, index, leads):
+    if not os.path.exists(phase3_scout.RAW_LEADS_PATH):
+        return 0
+    checkpoint = {} if args.all else read_checkpoint(phase4_analyst.CHECKPOINT_PATH)
+    reader = JsonlReader(phase3_scout.RAW_LEADS_PATH, offset=checkpoint.get("offset", 0),
+                         fingerprint=checkpoint.get("fingerprint"))
+    queued = 0
+    try:
+        while not reader.finished:
+            for article in reader.read_batch(args.window_size, 0):
+                if args.all or not index.is_analysed(article):
+                    leads.put(article)
+                    queued += 1
+    finally:
+        reader.close()
+    return queued
+
+# The scout runs in a worker thread (it has its own thread pool for the news APIs) and
+# pushes each new lead onto the queue as well as appending it to raw_leads.jsonl, after
+# the backlog of leads earlier runs didn't finish analysing.
+def scout_into_queue(icp_data, args, session, leads):
+    # The analyst waits on the queue until it's closed, so it's closed however this ends,
+    # setup failures (e.g. a vector index built with other dimensions) included
+    try:
+        index = LeadIndex()
+        ranker = phase3_scout.create_ranker(icp_data, args)
+        backlog = queue_backlog(args, index, leads)
+        clear_done(phase3_scout.RAW_LEADS_PATH)
+        writer = JsonlWriter(phase3_scout.RAW_LEADS_PATH, truncate=args.full)
+        stats = {}
+        try:
+            for lead in phase3_scout.scout_new_leads(icp_data["ideal_customer_profiles"], args, index, stats,
+                                                     session, ranker):
+                writer.write(lead)
+                leads.put(lead)
+        finally:
+            writer.close()
+            index.close()
+    finally:
+        leads.close()
+    mark_done(phase3_scout.RAW_LEADS_PATH)
+    stats["reassigned"] = ranker.reassigned if ranker is not None else 0
+    stats["backlog"] = backlog
+    return stats
+
+async def run_scout(run, icp_data):
+    stats = await asyncio.to_thread(scout_into_queue, icp_data, run["args"], run["clients"]["http"], run["leads"])
+    return stats, "ran", None
+
+async def run_analyst(run, icp_data):
+    args = run["args"]
+    index = LeadIndex()
+    incremental = not args.all and index.analysed_count() > 0
+    writer = JsonlWriter(phase4_analyst.QUALIFIED_LEADS_JSONL_PATH, truncate=not incremental)
+    prefilter = None if args.no_prefilter else PreFilter(icp_data, args.prefilter_threshold)
+    companies = phase4_analyst.open_company_index(args)
+    try:
+        totals = await phase4_analyst.stream_analysis(run["leads"], writer, index, args, prefilter,
+                                                      skip_analysed=not args.all, checkpoint_path=None,
+                                                      companies=companies)
+        totals["companies"] = companies.summary() if companies is not None else None
+    finally:
+        writer.close()
+        index.close()
+        if companies is not None:
+            companies.close()
+    totals["total_qualified"] = export_json_array(phase4_analyst.QUALIFIED_LEADS_JSONL_PATH, "qualified_leads.json",
+                                                  sort_key=fit_order, unique_key="article_id")
+    return totals, "ran", None
+
+# name -> (dependencies, stage function). The Analyst only needs the ICPs to start: it
+# consumes the Scout's leads from the queue while the Scout is still running.
+STAGES = {
+    "strategist": ([], run_strategist),
+    "icp_generator": (["strategist"], run_icp_generator),
+    "scout": (["icp_generator"], run_scout),
+    "analyst": (["icp_generator"], run_analyst),
+}
+
+# --- 6. DAG runner ---
+async def run_pipeline(run):
+    started = time.monotonic()
+    tasks = {}
+    timings = {}
+
+    async def run_stage(name):
+        dependencies, stage = STAGES[name]
+        inputs = [await tasks[dependency] for dependency in dependencies]
+        # Each stage runs in its own task, so its spans are tagged with the stage name
+        set_tags(phase=name)
+        stage_started = time.monotonic()
+        print(f"\n▶️  Stage '{name}' starting...")
+        try:
+            result, status, fingerprint_value = await stage(run, *inputs)
+        except Exception:
+            timings[name] = (stage_started - started, time.monotonic() - stage_started, "failed")
+            raise
+        timings[name] = (stage_started - started, time.monotonic() - stage_started, status)
+        if fingerprint_value is not None:
+            run["state"][name] = fingerprint_value
+        print(f"✔️  Stage '{name}' {status} in {timings[name][1]:.2f}s.")
+        return result
+
+    # Stages are created in dependency order, so every dependency's task already exists
+    for name in STAGES:
+        tasks[name] = asyncio.ensure_future(run_stage(name))
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    return dict(zip(tasks, results)), timings, time.monotonic() - started
+
+def print_timings(results, timings, total_seconds):
+    print("\n=================================================")
+    print("Pipeline stage timings:")
+    print(f"{'stage':<15} {'status':<8} {'start':>8} {'duration':>9}")
+    for name in STAGES:
+        start, duration, status = timings.get(name, (0.0, 0.0, "not run"))
+        print(f"{name:<15} {status:<8} {start:>7.2f}s {duration:>8.2f}s")
+    print(f"{'total':<15} {'':<8} {'':>8} {total_seconds:>8.2f}s")
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            print(f"❌ Stage '{name}' failed: {result}")
+
+# --- 7. Main execution block ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run Phases 1-4 as one pipeline.")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-run Phases 1 and 2 even if their inputs haven't changed.")
+    phase3_scout.add_scout_arguments(parser)
+    phase4_analyst.add_analysis_arguments(parser)
+    add_cache_arguments(parser)
+    add_telemetry_arguments(parser)
+    args = parser.parse_args()
+    configure_cache(args)
+    configure_telemetry(args, "pipeline")
+
+    try:
+        clients = create_shared_clients(args.workers)
+    except Exception as e:
+        print(f"Error initializing API clients: {e}")
+        exit()
+    phase4_analyst.use_clients(clients["async_openai"], clients["tavily"])
+
+    print("Starting the Greyamp lead pipeline (Strategist -> ICP Generator -> Scout -> Analyst)...")
+    run = {"args": args, "clients": clients, "state": load_state(), "leads": LeadQueue()}
+    results, timings, total_seconds = asyncio.run(run_pipeline(run))
+    clients["http"].close()
+    atomic_write_json(STATE_PATH, run["state"], indent=2)
+
+    scout_stats, analyst_totals = results.get("scout"), results.get("analyst")
+    if isinstance(scout_stats, dict):
+        print(f"\nScout: {scout_stats['new']} new raw lead(s), {scout_stats['already_seen']} already seen, "
+              f"{scout_stats['near_duplicates']} near-duplicate(s) collapsed, "
+              f"{scout_stats['reassigned']} re-matched to a better-fitting ICP; "
+              f"{scout_stats['backlog']} un-analysed lead(s) from earlier runs queued for the Analyst.")
+    if isinstance(analyst_totals, dict):
+        print(f"Analyst: {analyst_totals['qualified']} new qualified lead(s) "
+              f"({analyst_totals['total_qualified']} in 'qualified_leads.json'), "
+              f"{analyst_totals['failed']} failed and will be retried next run.")
+    print_timings(results, timings, total_seconds)
+    print(phase4_analyst.cascade_stats.summary())
+    print(phase4_analyst.prompt_stats.summary())
+    if isinstance(analyst_totals, dict) and analyst_totals["companies"]:
+        print(analyst_totals["companies"])
+    print(cache_summary())
+    qualified = analyst_totals["qualified"] if isinstance(analyst_totals, dict) else None
+    print(telemetry_summary(qualified))
+    print("=================================================")
+    cache.close()
+    telemetry.close()
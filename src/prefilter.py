@@ -0,0 +1,223 @@
+import re
+import json
+import argparse
+from jsonl_stream import JsonlReader
+
+# --- 1. Gazetteer & keyword lists ---
+# Deterministic, local scoring of raw articles so plainly out-of-scope stories (stock tips,
+# foreign companies, generic market commentary) never cost an LLM call in Phase 4.
+
+INDIAN_PLACES = [
+    "india", "indian", "bharat", "new delhi", "delhi", "mumbai", "bengaluru", "bangalore",
+    "hyderabad", "chennai", "pune", "kolkata", "ahmedabad", "gurgaon", "gurugram", "noida",
+    "jaipur", "kochi", "thiruvananthapuram", "coimbatore", "indore", "chandigarh", "lucknow",
+    "nagpur", "surat", "vadodara", "visakhapatnam", "bhubaneswar", "mysuru", "mysore",
+    "kerala", "karnataka", "maharashtra", "tamil nadu", "telangana", "andhra pradesh",
+    "gujarat", "west bengal", "uttar pradesh", "rajasthan", "haryana", "odisha", "goa",
+]
+
+INDIAN_COMPANIES = [
+    "tata", "tcs", "infosys", "wipro", "hcl", "tech mahindra", "mahindra", "reliance", "jio",
+    "airtel", "bharti", "vodafone idea", "bsnl", "adani", "larsen", "l&t", "ltimindtree",
+    "hdfc", "icici", "sbi", "state bank of india", "axis bank", "kotak", "bajaj",
+    "paytm", "phonepe", "razorpay", "zerodha", "flipkart", "myntra", "nykaa", "zomato",
+    "swiggy", "ola electric", "byju", "freshworks", "zoho", "tally solutions", "mphasis",
+    "persistent systems", "coforge", "hexaware", "sun pharma", "cipla", "dr reddy", "lupin",
+    "biocon", "apollo hospitals", "fortis", "narayana health", "qure.ai", "niramai", "sarvam",
+    "krutrim", "indiaai", "nasscom", "department of telecommunications", "meity", "isro", "nse",
+    "bse", "ril", "life insurance corporation",
+]
+
+# Things the analysis prompt explicitly tells the model to reject: stock tips, earnings and
+# market-size reports, entertainment. Only generic story types belong here, never phrases
+# from individual articles (the --report sample would then just be grading itself).
+NEGATIVE_PATTERNS = [
+    r"\bstocks? to (buy|watch|sell)\b", r"\btarget price\b", r"\b(buy|sell|hold) rating\b",
+    r"\bshare price\b", r"\bstock is trading\b", r"\bmultibagger\b", r"\bsensex\b", r"\bnifty\b",
+    r"\bbrokerages?\b", r"\bq[1-4] earnings\b", r"\bearnings call\b", r"\bipo gmp\b",
+    r"\bmarket size\b", r"\bcagr\b", r"\bmarket report\b",
+    r"\bcomic\b", r"\bbox office\b", r"\bmovie\b", r"\bcelebrity\b", r"\bcricket\b",
+]
+
+# Generic "something tangible happened" verbs, on top of each ICP's own buying signals
+EVENT_WORDS = [
+    "launch", "launches", "unveil", "unveils", "partner", "partners", "partnership", "tie up",
+    "ties up", "deal", "acquire", "acquires", "acquisition", "invest", "invests", "investment",
+    "funding", "raises", "hiring", "deploy", "deploys", "integrates", "signs", "pact", "mou",
+]
+
+AI_WORDS = ["ai", "artificial intelligence", "genai", "generative ai", "machine learning", "llm", "agentic"]
+
+STOPWORDS = {"a", "an", "the", "in", "into", "of", "for", "with", "and", "to", "on", "new", "based"}
+
+DEFAULT_THRESHOLD = 2.0
+
+# --- 2. Helpers ---
+def _phrase_pattern(phrases):
+    escaped = sorted((re.escape(phrase) for phrase in phrases), key=len, reverse=True)
+    return re.compile(r"(?<![a-z0-9])(" + "|".join(escaped) + r")(?![a-z0-9])")
+
+_PLACES = _phrase_pattern(INDIAN_PLACES)
+_COMPANIES = _phrase_pattern(INDIAN_COMPANIES)
+_EVENTS = _phrase_pattern(EVENT_WORDS)
+_AI = _phrase_pattern(AI_WORDS)
+_NEGATIVES = [re.compile(pattern) for pattern in NEGATIVE_PATTERNS]
+
+def article_text(article):
+    return " ".join(str(article.get(field) or "") for field in ("title", "description", "content")).lower()
+
+# ICP terms: industries plus the content words of the buying signals ("hiring AI engineers"
+# -> "hiring", "engineers"). "Telecommunications" also matches the common short form "telecom".
+def icp_terms(icp):
+    industries = set()
+    for industry in icp.get("industry_vertical", []):
+        industry = industry.lower()
+        industries.add(industry)
+        if industry.startswith("telecommunication"):
+            industries.add("telecom")
+    signal_words = {
+        word for signal in icp.get("buying_signals", [])
+        for word in re.findall(r"[a-z]+", signal.lower())
+        if word not in STOPWORDS and word != "ai" and len(word) > 2
+    }
+    cities = {city.lower() for city in icp.get("location_cities", [])}
+    return {
+        "industries": _phrase_pattern(industries) if industries else None,
+        "signals": _phrase_pattern(signal_words) if signal_words else None,
+        "cities": _phrase_pattern(cities) if cities else None,
+    }
+
+# --- 3. Scoring ---
+class PreFilter:
+    def __init__(self, icp_data, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        profiles = (icp_data or {}).get("ideal_customer_profiles", [])
+        self.terms_by_icp = {icp.get("icp_name"): icp_terms(icp) for icp in profiles}
+        # Articles without a (known) matched_icp are scored against every ICP combined
+        merged = {
+            "industry_vertical": [i for icp in profiles for i in icp.get("industry_vertical", [])],
+            "buying_signals": [s for icp in profiles for s in icp.get("buying_signals", [])],
+            "location_cities": [c for icp in profiles for c in icp.get("location_cities", [])],
+        }
+        self.any_icp_terms = icp_terms(merged)
+
+    # Returns (score, reasons). Roughly: +2 Indian presence, +1 ICP city, +1 industry,
+    # +1 AI, +1 tangible event / buying signal, -2 per rejection pattern. An article the
+    # vector index re-matched to another ICP is scored against both and keeps the better one.
+    def score(self, article):
+        text = article_text(article)
+        names = {article.get("matched_icp"), article.get("query_icp", article.get("matched_icp"))}
+        return max(self._score_terms(text, self.terms_by_icp.get(name, self.any_icp_terms)) for name in names)
+
+    def _score_terms(self, text, terms):
+        score, reasons = 0.0, []
+
+        if _PLACES.search(text) or _COMPANIES.search(text):
+            score += 2
+            reasons.append("india")
+        if terms["cities"] and terms["cities"].search(text):
+            score += 1
+            reasons.append("icp-city")
+        if terms["industries"] and terms["industries"].search(text):
+            score += 1
+            reasons.append("industry")
+        if _AI.search(text):
+            score += 1
+            reasons.append("ai")
+        if _EVENTS.search(text) or (terms["signals"] and terms["signals"].search(text)):
+            score += 1
+            reasons.append("event")
+        for pattern in _NEGATIVES:
+            if pattern.search(text):
+                score -= 2
+                reasons.append(f"negative:{pattern.pattern}")
+        return score, reasons
+
+    def is_plausible(self, article):
+        return self.score(article)[0] >= self.threshold
+
+    # Splits articles into (kept, rejected), preserving order
+    def split(self, articles):
+        kept, rejected = [], []
+        for article in articles:
+            (kept if self.is_plausible(article) else rejected).append(article)
+        return kept, rejected
+
+# --- 4. Precision / recall against a past Phase 4 run ---
+# qualified_leads.json has no article URL, so each qualified lead is matched back to the raw
+# article whose words overlap most with the lead's summary and signal.
+def _words(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower())) - STOPWORDS
+
+# Returns {raw article index: qualified lead}
+def match_leads_to_articles(raw_leads, qualified_leads):
+    article_words = [_words(article_text(article)) for article in raw_leads]
+    matches = {}
+    for lead in qualified_leads:
+        lead_words = _words(" ".join(str(lead.get(field) or "") for field in
+                                     ("company_name", "qualifying_event_signal", "summary")))
+        overlaps = [len(lead_words & words) / (len(lead_words) or 1) for words in article_words]
+        if overlaps and max(overlaps) > 0:
+            matches[overlaps.index(max(overlaps))] = lead
+    return matches
+
+def label_positives(raw_leads, qualified_leads):
+    return set(match_leads_to_articles(raw_leads, qualified_leads))
+
+def evaluate(prefilter, raw_leads, positives):
+    kept = {index for index, article in enumerate(raw_leads) if prefilter.is_plausible(article)}
+    true_positives = len(kept & positives)
+    precision = true_positives / len(kept) if kept else 0.0
+    recall = true_positives / len(positives) if positives else 0.0
+    return {"kept": len(kept), "rejected": len(raw_leads) - len(kept),
+            "precision": precision, "recall": recall}
+
+def load_json(filepath, default):
+    try:
+        with open(filepath, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        print(f"Error: Could not load '{filepath}'.")
+        return default
+
+# Phase 3 now writes raw_leads.jsonl; older runs left a raw_leads.json array
+def load_leads(filepath):
+    if not filepath.endswith(".jsonl"):
+        return load_json(filepath, [])
+    try:
+        reader = JsonlReader(filepath)
+        leads = list(reader)
+        reader.close()
+        return leads
+    except (FileNotFoundError, json.JSONDecodeError):
+        print(f"Error: Could not load '{filepath}'.")
+        return []
+
+# --- 5. Report (python prefilter.py --report) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score raw leads locally and report precision/recall.")
+    parser.add_argument("--report", action="store_true", help="Print precision/recall for a range of thresholds.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--raw", default="raw_leads.jsonl")
+    parser.add_argument("--qualified", default="qualified_leads.json")
+    parser.add_argument("--icps", default="icp_profiles.json")
+    args = parser.parse_args()
+
+    raw_leads = load_leads(args.raw)
+    icp_data = load_json(args.icps, {})
+    prefilter = PreFilter(icp_data, args.threshold)
+
+    if args.report:
+        positives = label_positives(raw_leads, load_json(args.qualified, []))
+        print(f"{len(raw_leads)} raw article(s), {len(positives)} led to a qualified lead in the past run.\n")
+        print("threshold   kept  rejected  precision  recall")
+        for threshold in [1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0]:
+            prefilter.threshold = threshold
+            result = evaluate(prefilter, raw_leads, positives)
+            print(f"{threshold:>9.1f}  {result['kept']:>5}  {result['rejected']:>8}  "
+                  f"{result['precision']:>9.2f}  {result['recall']:>6.2f}")
+    else:
+        for article in raw_leads:
+            score, reasons = prefilter.score(article)
+            verdict = "✅" if score >= prefilter.threshold else "❌"
+            print(f"{verdict} {score:>4.1f}  {article.get('title', 'Untitled')[:80]}  ({', '.join(reasons)})")
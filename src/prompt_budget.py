@@ -0,0 +1,155 @@
+import os
+import re
+from near_duplicates import BOILERPLATE_PATTERNS
+from company_names import normalize_company_name
+
+# --- 1. Settings ---
+# Phase 4 prompts are built from a static instruction block (sent first, identical for every
+# article, so the provider's prompt cache can reuse it) followed by the article and the
+# Tavily context, both cleaned and trimmed to a token budget. Tokens are counted locally:
+# with tiktoken if it's installed and its encoding is available, otherwise estimated from
+# the words and punctuation in the text.
+ARTICLE_TOKEN_BUDGET = int(os.getenv("PHASE4_ARTICLE_TOKENS", "300"))
+SNIPPET_TOKEN_BUDGET = int(os.getenv("PHASE4_SNIPPET_TOKENS", "120"))  # per Tavily search
+# Share of the description's words that must already be in the title/content for it to be dropped
+DESCRIPTION_OVERLAP = 0.8
+TOKENIZER_ENCODING = os.getenv("TIKTOKEN_ENCODING", "o200k_base")  # gpt-4o / gpt-4o-mini
+
+# News API truncation tails ("planning, M... [2376 chars]") including the cut-off word
+TRUNCATION_TAIL = re.compile(r"\S*(\.\.\.|…)?\s*\[\+?\d+ chars\]\s*$")
+# Sentences from search results that carry no information about the company
+SNIPPET_NOISE = re.compile(
+    r"^(advertisement|read more|subscribe|sign (in|up)|log ?in|click here|skip to|share this|follow us|"
+    r"all rights reserved|cookie|privacy policy|terms of (use|service)|related (news|articles))",
+    re.IGNORECASE,
+)
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# --- 2. Local token counting ---
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            # Not installed, or the encoding can't be downloaded: fall back to the estimate
+            _encoding = False
+    return _encoding
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    # Roughly one token per word or punctuation mark in English news text
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+# Cuts text to at most `budget` tokens, at a sentence boundary where possible
+def truncate_to_tokens(text, budget):
+    if count_tokens(text) <= budget:
+        return text
+    kept = []
+    for sentence in SENTENCE_SPLIT.split(text):
+        if count_tokens(" ".join(kept + [sentence])) > budget:
+            break
+        kept.append(sentence)
+    if kept:
+        return " ".join(kept)
+    # A single over-long sentence: keep its first words
+    words = text.split()
+    while words and count_tokens(" ".join(words)) > budget:
+        words = words[:max(1, len(words) * 3 // 4)] if len(words) > 1 else []
+    return " ".join(words)
+
+# --- 3. Cleaning ---
+def strip_boilerplate(text):
+    if not text:
+        return ""
+    text = TRUNCATION_TAIL.sub("", text)
+    for pattern in BOILERPLATE_PATTERNS:
+        text = pattern.sub(" ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def _words(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+# The article fields that go into a prompt: boilerplate removed, the description dropped when
+# the title and content snippet already say almost everything in it, and the content
+# trimmed to the budget
+def compact_article(article, token_budget=ARTICLE_TOKEN_BUDGET):
+    title = strip_boilerplate(article.get("title")) or "N/A"
+    description = strip_boilerplate(article.get("description"))
+    content = strip_boilerplate(article.get("content"))
+    description_words = _words(description)
+    if description_words:
+        covered = set(_words(title)) | set(_words(content))
+        if sum(1 for word in description_words if word in covered) >= DESCRIPTION_OVERLAP * len(description_words):
+            description = ""
+    budget = max(0, token_budget - count_tokens(title) - count_tokens(description))
+    return {
+        "title": title,
+        "description": description or "N/A",
+        "content": truncate_to_tokens(content, budget) if content else "N/A",
+    }
+
+def article_tokens(article):
+    return sum(count_tokens(str(article.get(field) or "")) for field in ("title", "description", "content"))
+
+# --- 4. Ranking search snippets ---
+# Search results are split into sentences and each sentence is scored by how much it says
+# about this company: its name, then the words the search was after (city, CEO, ...). The
+# best sentences that fit the budget are kept, in their original order, without repeats.
+def rank_snippets(snippets, company_name, terms=(), token_budget=SNIPPET_TOKEN_BUDGET):
+    name_words = set(_words(normalize_company_name(company_name) or company_name or ""))
+    candidates, seen = [], set()
+    for snippet in snippets:
+        for sentence in SENTENCE_SPLIT.split(strip_boilerplate(snippet)):
+            sentence = sentence.strip()
+            key = " ".join(_words(sentence))
+            if len(key) < 20 or key in seen or SNIPPET_NOISE.match(sentence):
+                continue
+            seen.add(key)
+            words = set(key.split())
+            lowered = sentence.lower()
+            score = 2 * len(name_words & words) / max(1, len(name_words))
+            score += sum(1 for term in terms if term in lowered)
+            candidates.append((score, len(candidates), sentence))
+
+    # Sentences that mention neither the company nor what we searched for only go in when
+    # nothing else does
+    relevant = [candidate for candidate in candidates if candidate[0] > 0] or candidates
+    kept, used = [], 0
+    for score, position, sentence in sorted(relevant, key=lambda item: (-item[0], item[1])):
+        tokens = count_tokens(sentence)
+        if used + tokens > token_budget:
+            continue
+        kept.append((position, sentence))
+        used += tokens
+    return " ".join(sentence for _, sentence in sorted(kept))
+
+# --- 5. Savings report ---
+# Compares the article and search text actually sent with what the untrimmed versions would
+# have cost (the instruction block is the same either way, so it isn't counted)
+class PromptStats:
+    def __init__(self):
+        self.leads = 0
+        self.raw_tokens = 0
+        self.sent_tokens = 0
+
+    def add(self, raw_tokens, sent_tokens):
+        self.raw_tokens += raw_tokens
+        self.sent_tokens += sent_tokens
+
+    def summary(self):
+        if not self.raw_tokens:
+            return "Prompt budget: no prompts built"
+        saved = self.raw_tokens - self.sent_tokens
+        per_lead = f", ~{saved / self.leads:.0f} per lead over {self.leads} lead(s)" if self.leads else ""
+        return (f"✂️  Prompt budget: ~{self.sent_tokens} article/search tokens sent instead of ~{self.raw_tokens}: "
+                f"saved ~{saved} ({saved / self.raw_tokens:.0%}){per_lead}")
+
+prompt_stats = PromptStats()
@@ -0,0 +1,230 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+# --- 1. Provider budgets ---
+# Requests-per-minute (rpm) and tokens-per-minute (tpm) budgets for every external API.
+# Each value can be overridden from .env, e.g. OPENAI_RPM=500, OPENAI_TPM=200000, TAVILY_RPM=100.
+DEFAULT_BUDGETS = {
+    "openai": {"rpm": 500, "tpm": 200000},
+    "tavily": {"rpm": 100, "tpm": None},
+    "gnews": {"rpm": 60, "tpm": None},
+    "newsapi": {"rpm": 60, "tpm": None},
+}
+
+# HTTP statuses that mean "try again later" rather than "your request is wrong"
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Network-level failures from requests / httpx / openai / tavily, matched by class name so
+# this module doesn't need to import any of those libraries. Tavily turns HTTP 429 into
+# UsageLimitExceededError without attaching the response.
+TRANSIENT_ERRORS = {
+    "ConnectionError", "Timeout", "ConnectTimeout", "ReadTimeout", "TimeoutError",
+    "ConnectError", "ReadError", "TimeoutException",
+    "APIConnectionError", "APITimeoutError", "RateLimitError", "UsageLimitExceededError",
+}
+
+MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = float(os.getenv("API_BACKOFF_BASE", "1.0"))
+BACKOFF_CAP_SECONDS = float(os.getenv("API_BACKOFF_CAP", "60.0"))
+
+# Share of each budget this process may use; sharded Phase 4 workers split it between them
+_budget_share = 1.0
+
+def load_budget(provider):
+    defaults = DEFAULT_BUDGETS.get(provider, {"rpm": 60, "tpm": None})
+    budget = {}
+    for key in ("rpm", "tpm"):
+        value = os.getenv(f"{provider.upper()}_{key.upper()}")
+        budget[key] = float(value) if value else defaults.get(key)
+        if budget[key]:
+            budget[key] *= _budget_share
+    return budget
+
+# --- 2. Token bucket ---
+# Refills continuously at `per_minute / 60` units per second. The capacity allows a short
+# burst (a few seconds' worth) without ever exceeding the per-minute budget on average.
+class TokenBucket:
+    def __init__(self, per_minute, burst_seconds=6.0, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated_at = clock()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    # Takes `amount` if available and returns 0, otherwise returns how long to wait
+    def try_acquire(self, amount=1.0):
+        # A single request may be larger than the burst, so never ask for more than fits
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = self.clock()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self._refill(now)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    # Called when the provider sends Retry-After: everyone sharing the bucket waits
+    def pause(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+# --- 3. Per-provider limiter (requests bucket + optional tokens bucket) ---
+class ProviderLimiter:
+    def __init__(self, provider, rpm, tpm=None):
+        self.provider = provider
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def _wait_time(self, tokens):
+        wait = self.requests.try_acquire(1)
+        if wait > 0:
+            return wait
+        if self.tokens and tokens:
+            wait = self.tokens.try_acquire(tokens)
+            if wait > 0:
+                # Give the request slot back so the two buckets stay in step
+                with self.requests.lock:
+                    self.requests.tokens = min(self.requests.capacity, self.requests.tokens + 1)
+            return wait
+        return 0.0
+
+    def acquire(self, tokens=0):
+        while True:
+            wait = self._wait_time(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=0):
+        while True:
+            wait = self._wait_time(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        self.requests.pause(seconds)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def set_budget_share(share):
+    global _budget_share
+    with _limiters_lock:
+        _budget_share = share
+        _limiters.clear()
+
+def get_limiter(provider):
+    with _limiters_lock:
+        if provider not in _limiters:
+            budget = load_budget(provider)
+            _limiters[provider] = ProviderLimiter(provider, budget["rpm"], budget["tpm"])
+        return _limiters[provider]
+
+# --- 4. Error classification & backoff ---
+def parse_retry_after(headers):
+    if not headers:
+        return None
+    # OpenAI sends a millisecond variant alongside the standard header
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after") or headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    # Retry-After may also be an HTTP date
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# Returns (retryable, retry_after_seconds) for an exception raised by any provider call
+def classify_error(error):
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS, parse_retry_after(headers)
+    names = {cls.__name__ for cls in type(error).__mro__}
+    return bool(names & TRANSIENT_ERRORS), None
+
+# Full jitter exponential backoff, unless the server told us exactly how long to wait
+def backoff_delay(attempt, retry_after=None):
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_CAP_SECONDS) + random.uniform(0, BACKOFF_BASE_SECONDS / 2)
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def _describe(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return f"HTTP {status}" if status else type(error).__name__
+
+# --- 5. Rate-limited calls with retries ---
+# `make_call` is a zero-argument function doing the actual request. `tokens` is the
+# estimated token cost, only used by providers that have a tpm budget. `span` (a telemetry
+# record, optional) gets the retry count and the time spent waiting on the limiter.
+def call_with_backoff(provider, make_call, tokens=0, span=None):
+    limiter = get_limiter(provider)
+    for attempt in range(MAX_RETRIES + 1):
+        waited = time.monotonic()
+        limiter.acquire(tokens)
+        if span is not None:
+            span["throttle_ms"] = span.get("throttle_ms", 0) + round((time.monotonic() - waited) * 1000, 2)
+        try:
+            return make_call()
+        except Exception as e:
+            retryable, retry_after = classify_error(e)
+            if not retryable or attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, retry_after)
+            if span is not None:
+                span["retries"] = attempt + 1
+            if retry_after is not None:
+                limiter.pause(delay)
+            print(f"   ⏳ {provider} {_describe(e)}, retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_RETRIES})")
+            time.sleep(delay)
+
+# Same as call_with_backoff, but `make_call` returns a coroutine
+async def call_with_backoff_async(provider, make_call, tokens=0, span=None):
+    limiter = get_limiter(provider)
+    for attempt in range(MAX_RETRIES + 1):
+        waited = time.monotonic()
+        await limiter.acquire_async(tokens)
+        if span is not None:
+            span["throttle_ms"] = span.get("throttle_ms", 0) + round((time.monotonic() - waited) * 1000, 2)
+        try:
+            return await make_call()
+        except Exception as e:
+            retryable, retry_after = classify_error(e)
+            if not retryable or attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, retry_after)
+            if span is not None:
+                span["retries"] = attempt + 1
+            if retry_after is not None:
+                limiter.pause(delay)
+            print(f"   ⏳ {provider} {_describe(e)}, retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_RETRIES})")
+            await asyncio.sleep(delay)
+
+# Rough token estimate for a chat request (~4 characters per token plus room for the reply)
+def estimate_chat_tokens(messages, completion_allowance=500):
+    characters = sum(len(message.get("content") or "") for message in messages)
+    return characters // 4 + completion_allowance
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# --- 1. Settings ---
+# One SQLite file shared by every phase. Entries are keyed by a hash of the provider plus
+# the full request (model + prompt + params, or the search query), so identical requests
+# are answered from disk instead of the network.
+CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", ".response_cache.sqlite")
+MAX_CACHE_BYTES = int(float(os.getenv("RESPONSE_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+# How long an entry stays valid, per provider. LLM answers for an identical prompt don't go
+# stale; company facts change slowly; news searches should be refreshed often.
+TTL_SECONDS = {
+    "openai": float(os.getenv("OPENAI_CACHE_TTL_HOURS", "720")) * 3600,
+    "tavily": float(os.getenv("TAVILY_CACHE_TTL_HOURS", "168")) * 3600,
+    "gnews": float(os.getenv("NEWS_CACHE_TTL_HOURS", "1")) * 3600,
+    "newsapi": float(os.getenv("NEWS_CACHE_TTL_HOURS", "1")) * 3600,
+}
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+# Request fields that must never end up in the key (API keys rotate, the answer doesn't)
+SECRET_PARAMS = {"token", "apiKey", "api_key"}
+
+# Check the total size only every few writes; SUM() over the table isn't free
+EVICTION_CHECK_EVERY = 50
+
+# --- 2. Cache store ---
+# mode is one of:
+#   "use"     - read and write the cache (default)
+#   "refresh" - ignore existing entries but store fresh responses (--refresh)
+#   "off"     - don't touch the cache at all (--no-cache)
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES, mode="use"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.writes_since_check = 0
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # WAL lets several phases (or processes) read while one writes
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+            self.connection.commit()
+        return self.connection
+
+    def get(self, provider, request):
+        if self.mode != "use":
+            return None
+        key = make_key(provider, request)
+        now = time.time()
+        with self.lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+            connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, provider, request, value):
+        if self.mode == "off":
+            return
+        key = make_key(provider, request)
+        payload = json.dumps(value)
+        now = time.time()
+        ttl = TTL_SECONDS.get(provider, DEFAULT_TTL_SECONDS)
+        with self.lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, payload, len(payload), now, now + ttl, now),
+            )
+            connection.commit()
+            self.writes_since_check += 1
+            if self.writes_since_check >= EVICTION_CHECK_EVERY:
+                self.writes_since_check = 0
+                self._evict(connection)
+
+    # Drops expired entries, then least-recently-used ones until we're back under 90% of the limit
+    def _evict(self, connection):
+        connection.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            target = self.max_bytes * 0.9
+            freed = 0
+            stale_keys = []
+            for key, size in connection.execute("SELECT key, size FROM responses ORDER BY last_access"):
+                if total - freed <= target:
+                    break
+                stale_keys.append((key,))
+                freed += size
+            connection.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+        connection.commit()
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self._evict(self.connection)
+                self.connection.close()
+                self.connection = None
+
+def make_key(provider, request):
+    request = {k: v for k, v in request.items() if k not in SECRET_PARAMS}
+    canonical = json.dumps({"provider": provider, "request": request}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+# --- 3. Shared instance + command-line switches ---
+cache = ResponseCache()
+
+def add_cache_arguments(parser):
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Don't read or write the response cache.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignore cached responses but store the fresh ones.")
+
+def configure_cache(args):
+    if args.no_cache:
+        cache.mode = "off"
+    elif args.refresh:
+        cache.mode = "refresh"
+
+def cache_summary():
+    return f"Response cache: {cache.hits} hit(s), {cache.misses} miss(es) (mode: {cache.mode})"
@@ -0,0 +1,191 @@
+import os
+import json
+import math
+import time
+import uuid
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- 1. Settings ---
+# Every OpenAI, Tavily and news API call (see api_calls.py) becomes one span: latency,
+# retries, tokens, estimated cost and whether the response cache answered it, tagged with
+# the phase, article and ICP it was made for. Spans are appended to a JSONL file and
+# summarised at the end of the run.
+TELEMETRY_PATH = os.getenv("TELEMETRY_PATH", "telemetry.jsonl")
+
+# USD per 1M tokens (input, output); override with e.g. GPT_4O_PRICE="2.5,10"
+def _price(env_name, default):
+    value = os.getenv(env_name)
+    return tuple(float(part) for part in value.split(",")) if value else default
+
+MODEL_PRICES = {
+    "gpt-4o": _price("GPT_4O_PRICE", (2.50, 10.00)),
+    "gpt-4o-mini": _price("GPT_4O_MINI_PRICE", (0.15, 0.60)),
+}
+# USD per request for the search APIs (news APIs are flat-rate plans, so 0 by default)
+REQUEST_PRICES = {
+    "tavily": float(os.getenv("TAVILY_PRICE_PER_SEARCH", "0.008")),
+    "gnews": float(os.getenv("GNEWS_PRICE_PER_REQUEST", "0")),
+    "newsapi": float(os.getenv("NEWSAPI_PRICE_PER_REQUEST", "0")),
+}
+
+# Tags (phase, article_id, icp, ...) follow the code that sets them: contextvars carry them
+# into asyncio tasks and asyncio.to_thread, so a span picks up whatever is current.
+_tags = contextvars.ContextVar("telemetry_tags", default={})
+
+@contextmanager
+def tagged(**tags):
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+# Adds tags for the rest of the current asyncio task (each gathered coroutine runs in its
+# own task with its own copy of the context, so this doesn't leak into its siblings)
+def set_tags(**tags):
+    _tags.set({**_tags.get(), **tags})
+
+def estimate_cost(provider, model=None, prompt_tokens=0, completion_tokens=0):
+    if provider == "openai":
+        input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+    return REQUEST_PRICES.get(provider, 0.0)
+
+# Nearest-rank percentile of an already sorted list
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+# --- 2. Span recorder ---
+class Telemetry:
+    def __init__(self, path=TELEMETRY_PATH, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.run_id = uuid.uuid4().hex[:12]
+        self.lock = threading.Lock()
+        self.file = None
+        # Only per-provider counters and latencies stay in memory; the spans themselves go to disk
+        self.stats = {}
+
+    # Usage:  with telemetry.span("openai", model="gpt-4o") as span: ... span["cache_hit"] = True
+    @contextmanager
+    def span(self, provider, **fields):
+        record = {"provider": provider, **fields, "retries": 0, "cache_hit": False}
+        started = time.monotonic()
+        try:
+            yield record
+            record["status"] = "ok"
+        except BaseException as e:
+            record["status"] = "error"
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["latency_ms"] = round((time.monotonic() - started) * 1000, 2)
+            if not record["cache_hit"]:
+                record["cost_usd"] = estimate_cost(provider, record.get("model"),
+                                                   record.get("prompt_tokens", 0), record.get("completion_tokens", 0))
+            else:
+                record["cost_usd"] = 0.0
+            self.record(record)
+
+    def record(self, record):
+        if not self.enabled:
+            return
+        record = {"run_id": self.run_id, "ts": time.time(), **_tags.get(), **record}
+        with self.lock:
+            self._aggregate(record)
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self.file.flush()
+
+    def _aggregate(self, record):
+        stats = self.stats.setdefault(record["provider"], {
+            "calls": 0, "cache_hits": 0, "errors": 0, "retries": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "throttle_ms": 0.0, "latencies": [],
+        })
+        stats["calls"] += 1
+        stats["retries"] += record.get("retries", 0)
+        stats["prompt_tokens"] += record.get("prompt_tokens", 0)
+        stats["completion_tokens"] += record.get("completion_tokens", 0)
+        stats["cost_usd"] += record.get("cost_usd", 0.0)
+        stats["throttle_ms"] += record.get("throttle_ms", 0.0)
+        if record.get("status") == "error":
+            stats["errors"] += 1
+        if record.get("cache_hit"):
+            stats["cache_hits"] += 1
+        else:
+            # Percentiles describe the network calls; cache hits would drag them towards 0
+            stats["latencies"].append(record["latency_ms"])
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+# --- 3. Summary ---
+def summarise(stats, qualified_leads=None):
+    # Latencies include time spent waiting on our own rate limiter, shown as "throttled"
+    lines = ["provider   calls  cached  errors  retries    p50 ms    p95 ms    p99 ms  throttled s   tokens in/out     cost $"]
+    total_cost = 0.0
+    for provider, s in sorted(stats.items()):
+        latencies = sorted(s["latencies"])
+        total_cost += s["cost_usd"]
+        tokens = f"{s['prompt_tokens']}/{s['completion_tokens']}" if s["prompt_tokens"] else "-"
+        lines.append(f"{provider:<9} {s['calls']:>6} {s['cache_hits']:>7} {s['errors']:>7} {s['retries']:>8} "
+                     f"{percentile(latencies, 0.50):>9.1f} {percentile(latencies, 0.95):>9.1f} "
+                     f"{percentile(latencies, 0.99):>9.1f} {s['throttle_ms'] / 1000:>12.1f} {tokens:>15} {s['cost_usd']:>10.4f}")
+    lines.append(f"Estimated cost: ${total_cost:.4f}")
+    if qualified_leads:
+        lines.append(f"Cost per qualified lead: ${total_cost / qualified_leads:.4f} ({qualified_leads} lead(s))")
+    return "\n".join(lines)
+
+# Rebuilds the aggregates from a spans file (optionally for one run only)
+def load_stats(filepath=TELEMETRY_PATH, run_id=None):
+    recorder = Telemetry(filepath, enabled=False)
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if run_id is None or record.get("run_id") == run_id:
+                recorder._aggregate(record)
+    return recorder.stats
+
+# --- 4. Shared instance + command-line switches ---
+telemetry = Telemetry()
+
+def add_telemetry_arguments(parser):
+    parser.add_argument("--telemetry-path", default=TELEMETRY_PATH,
+                        help="JSONL file the per-call spans are appended to.")
+    parser.add_argument("--no-telemetry", action="store_true",
+                        help="Don't record per-call spans.")
+
+# Tags every span from this process with the phase name
+def configure_telemetry(args, phase):
+    telemetry.path = args.telemetry_path
+    telemetry.enabled = not args.no_telemetry
+    _tags.set({"phase": phase})
+
+def telemetry_summary(qualified_leads=None):
+    if not telemetry.enabled:
+        return "Telemetry: off"
+    if not telemetry.stats:
+        return "Telemetry: no API calls recorded"
+    return (f"Telemetry (run {telemetry.run_id}, spans in '{telemetry.path}'):\n"
+            + summarise(telemetry.stats, qualified_leads))
+
+# --- 5. Report (python telemetry.py [--run RUN_ID] [--qualified N]) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise recorded API call spans.")
+    parser.add_argument("--path", default=TELEMETRY_PATH)
+    parser.add_argument("--run", default=None, help="Only include spans from this run id.")
+    parser.add_argument("--qualified", type=int, default=None, help="Qualified leads, for cost per lead.")
+    args = parser.parse_args()
+    print(summarise(load_stats(args.path, args.run), args.qualified))
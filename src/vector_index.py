@@ -0,0 +1,228 @@
+import os
+import re
+import zlib
+import time
+import hashlib
+import argparse
+import numpy as np
+from near_duplicates import article_text
+from lead_index import article_key
+from jsonl_stream import atomic_write_json, read_checkpoint
+from prefilter import load_leads, load_json
+
+# --- 1. Settings ---
+# Local, model-free embeddings for matching articles to ICPs. Words are hashed into a fixed
+# number of dimensions (signed feature hashing, so no vocabulary has to be stored or kept in
+# sync) with log-scaled counts, and weighted by IDF at scoring time. Article vectors are
+# appended to a memory-mapped float16 matrix on disk, one row per article, so the index
+# grows incrementally as Phase 3 finds new articles and scoring 100k+ rows is a handful of
+# matrix products. Document frequencies live next to it, so IDF always covers every row.
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", ".vector_index")
+# 1024 dimensions keep hash collisions between the short ICP texts and article words rare,
+# at 2 KB per article
+DIMENSIONS = int(os.getenv("VECTOR_DIMENSIONS", "1024"))
+# An article keeps the ICP whose query found it unless another ICP fits it better by this much
+REASSIGN_MARGIN = float(os.getenv("ICP_REASSIGN_MARGIN", "0.02"))
+# Rows scored per matrix product (bounds the float32 working copy to ~128 MB at 1024 dims)
+SCORING_CHUNK = 32768
+
+STOPWORDS = {
+    "a", "an", "the", "in", "into", "of", "for", "with", "and", "or", "to", "on", "at", "by", "from", "as",
+    "is", "are", "was", "were", "be", "been", "has", "have", "had", "its", "it", "this", "that", "these",
+    "will", "would", "can", "could", "said", "says", "also", "more", "than", "their", "they", "he", "she",
+    "we", "our", "you", "your", "but", "not", "after", "over", "about", "which", "who", "new",
+}
+WORD_PATTERN = re.compile(r"[a-z][a-z0-9]+")
+
+# --- 2. Hashed term vectors ---
+# word -> dimension * 2 + sign bit (or -1 for stopwords), per number of dimensions; crc32 so the
+# mapping is the same in every process and run
+_codes = {}
+
+def _code(word, dimensions, codes):
+    if word in STOPWORDS:
+        code = -1
+    else:
+        value = zlib.crc32(word.encode("utf-8"))
+        code = (value % dimensions) * 2 + (value >> 31)
+    codes[word] = code
+    return code
+
+# Texts -> (len(texts) x dimensions) float32 matrix of signed, log-scaled word counts
+def embed_texts(texts, dimensions=DIMENSIONS):
+    codes = _codes.setdefault(dimensions, {})
+    flat_codes, lengths = [], []
+    for text in texts:
+        words = WORD_PATTERN.findall(text.lower())
+        flat_codes.extend([codes[word] if word in codes else _code(word, dimensions, codes) for word in words])
+        lengths.append(len(words))
+    flat_codes = np.asarray(flat_codes, dtype=np.int64)
+    rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+    kept = flat_codes >= 0
+    flat_codes, rows = flat_codes[kept], rows[kept]
+    signs = np.where(flat_codes & 1, 1.0, -1.0)
+    counts = np.bincount(rows * dimensions + (flat_codes >> 1), weights=signs, minlength=len(texts) * dimensions)
+    matrix = counts.reshape(len(texts), dimensions).astype(np.float32)
+    return np.sign(matrix) * np.log1p(np.abs(matrix))
+
+def icp_text(icp):
+    parts = [icp.get("icp_name", "")]
+    for field in ("industry_vertical", "key_challenges", "buying_signals"):
+        parts.extend(icp.get(field, []))
+    return " ".join(parts)
+
+def _row_id(article):
+    return hashlib.sha1(article_key(article).encode("utf-8")).digest()
+
+# --- 3. Index on disk ---
+#   vectors.f16  - float16 rows, appended in place and read through np.memmap
+#   keys.bin     - 20-byte sha1 of each row's article key, in row order
+#   meta.json    - row count and per-dimension document frequencies, replaced atomically
+#                  after the rows it describes are on disk (extra bytes from an
+#                  interrupted append are cut off on the next open)
+class VectorIndex:
+    def __init__(self, path=VECTOR_INDEX_PATH, dimensions=DIMENSIONS):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, "vectors.f16")
+        self.keys_path = os.path.join(path, "keys.bin")
+        self.meta_path = os.path.join(path, "meta.json")
+        meta = read_checkpoint(self.meta_path) or {"dimensions": dimensions, "rows": 0, "df": [0] * dimensions}
+        if meta["dimensions"] != dimensions:
+            raise ValueError(f"'{path}' holds {meta['dimensions']}-dimensional vectors, not {dimensions}; "
+                             f"remove it or set VECTOR_DIMENSIONS={meta['dimensions']}.")
+        self.dimensions = dimensions
+        self.rows = meta["rows"]
+        self.df = np.asarray(meta["df"], dtype=np.int64)
+        for filepath, width in ((self.vectors_path, dimensions * 2), (self.keys_path, 20)):
+            with open(filepath, "ab") as f:
+                f.truncate(self.rows * width)
+        self.row_by_id = {bytes(key): row for row, key in enumerate(self._keys())}
+        self._matrix = None
+
+    def _keys(self):
+        if not self.rows:
+            return []
+        return np.fromfile(self.keys_path, dtype="S20", count=self.rows)
+
+    def matrix(self):
+        if self._matrix is None or len(self._matrix) != self.rows:
+            self._matrix = (np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(self.rows, self.dimensions))
+                            if self.rows else np.zeros((0, self.dimensions), dtype=np.float16))
+        return self._matrix
+
+    def __len__(self):
+        return self.rows
+
+    # Adds the articles not indexed yet; returns every article's row number
+    def add(self, articles):
+        ids = [_row_id(article) for article in articles]
+        fresh = {}
+        for position, row_id in enumerate(ids):
+            if row_id not in self.row_by_id and row_id not in fresh:
+                fresh[row_id] = position
+        if fresh:
+            vectors = embed_texts([article_text(articles[position]) for position in fresh.values()], self.dimensions)
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.astype(np.float16).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(fresh))
+                f.flush()
+                os.fsync(f.fileno())
+            for row_id in fresh:
+                self.row_by_id[row_id] = self.rows
+                self.rows += 1
+            self.df += (vectors != 0).sum(axis=0)
+            atomic_write_json(self.meta_path, {"dimensions": self.dimensions, "rows": self.rows,
+                                               "df": self.df.tolist(), "updated_at": time.time()})
+        return [self.row_by_id[row_id] for row_id in ids]
+
+    def idf(self):
+        return np.log((1 + self.rows) / (1 + self.df)).astype(np.float32) + 1
+
+    # Cosine similarity of rows (all of them by default) against each query vector, both
+    # IDF-weighted, computed in chunks straight from the memory map
+    def score(self, queries, rows=None):
+        weights = self.idf()
+        queries = np.asarray(queries, dtype=np.float32) * weights
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-9)
+        matrix = self.matrix()
+        count = self.rows if rows is None else len(rows)
+        scores = np.empty((count, len(queries)), dtype=np.float32)
+        for start in range(0, count, SCORING_CHUNK):
+            # Contiguous slices when scoring everything; fancy indexing only for a subset
+            selection = slice(start, start + SCORING_CHUNK) if rows is None else np.asarray(rows[start:start + SCORING_CHUNK])
+            chunk = matrix[selection].astype(np.float32) * weights
+            norms = np.maximum(np.linalg.norm(chunk, axis=1, keepdims=True), 1e-9)
+            scores[start:start + len(chunk)] = (chunk / norms) @ queries.T
+        return scores
+
+# --- 4. ICP matching and lead ranking ---
+# Reassigns `matched_icp` to the ICP whose definition (industries, challenges, buying
+# signals) the article is closest to, and records that similarity as `icp_score`. The ICP
+# whose query found the article is kept in `query_icp`.
+class IcpRanker:
+    def __init__(self, icp_data, vectors, margin=REASSIGN_MARGIN):
+        self.margin = margin
+        self.icps = [icp.get("icp_name") for icp in icp_data.get("ideal_customer_profiles", [])]
+        self.vectors = vectors
+        self.queries = embed_texts([icp_text(icp) for icp in icp_data.get("ideal_customer_profiles", [])],
+                                   vectors.dimensions)
+        self.reassigned = 0
+
+    def assign(self, articles):
+        if not articles or not self.icps:
+            return articles
+        scores = self.vectors.score(self.queries, self.vectors.add(articles))
+        for article, row in zip(articles, scores):
+            best = int(row.argmax())
+            article.setdefault("query_icp", article.get("matched_icp"))
+            current = self.icps.index(article["query_icp"]) if article["query_icp"] in self.icps else None
+            if current is not None and row[best] - row[current] < self.margin:
+                best = current
+            elif current is not None:
+                self.reassigned += 1
+            article["matched_icp"] = self.icps[best]
+            article["icp_score"] = round(float(row[best]), 4)
+        return articles
+
+    # Every indexed article's best ICP and score, best fit first
+    def rank_all(self):
+        scores = self.vectors.score(self.queries)
+        best = scores.argmax(axis=1)
+        order = np.argsort(-scores[np.arange(len(scores)), best], kind="stable")
+        return [(int(row), self.icps[best[row]], float(scores[row, best[row]])) for row in order]
+
+# Highest ICP fit first; leads without a score (older raw leads) keep their order at the end
+def fit_order(lead):
+    score = lead.get("icp_score")
+    return -score if isinstance(score, (int, float)) else float("inf")
+
+# --- 5. Build / report (python vector_index.py [--add raw_leads.jsonl] [--top 10]) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index articles against the ICPs and show the best fits.")
+    parser.add_argument("--path", default=VECTOR_INDEX_PATH)
+    parser.add_argument("--icps", default="icp_profiles.json")
+    parser.add_argument("--add", default=None, help="Index every article of a raw leads file (.jsonl or .json).")
+    parser.add_argument("--top", type=int, default=10, help="Best-fitting articles to list.")
+    args = parser.parse_args()
+
+    vectors = VectorIndex(args.path)
+    ranker = IcpRanker(load_json(args.icps, {}), vectors)
+    titles = {}
+    if args.add:
+        articles = load_leads(args.add)
+        started = time.monotonic()
+        ranker.assign(articles)
+        print(f"Indexed {len(articles)} article(s) in {time.monotonic() - started:.2f}s "
+              f"({ranker.reassigned} matched to a different ICP than the query that found them).")
+        titles = {row: article.get("title") for row, article in zip(vectors.add(articles), articles)}
+
+    started = time.monotonic()
+    ranking = ranker.rank_all()
+    print(f"Scored {len(vectors)} indexed article(s) against {len(ranker.icps)} ICP(s) "
+          f"in {time.monotonic() - started:.3f}s. Best fits:")
+    for row, icp_name, score in ranking[:args.top]:
+        print(f"  {score:.3f}  {icp_name:<35} {titles.get(row, f'row {row}')}")
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+# --- 1. Settings ---
+# Work queue for sharded Phase 4 runs (phase4_analyst.py --shards N). The coordinator
+# enqueues every raw lead still to analyse, tagged with shard = hash(article key) % N and a
+# sequence number in raw_leads.jsonl order. Workers (local processes, or other machines
+# sharing the file) lease a window of items at a time, preferring their own shard, and
+# renew their leases while they work. A lease that isn't renewed expires and the items go
+# to whichever worker asks next, so a crashed worker's items are picked up again. Results
+# are merged by sequence number, so the output order never depends on scheduling.
+QUEUE_PATH = os.getenv("PHASE4_QUEUE_PATH", "phase4_queue.sqlite")
+DEFAULT_LEASE_SECONDS = float(os.getenv("PHASE4_LEASE_SECONDS", "300"))
+# Leases an item may take (crashes and failed analyses both count) before it's given up on
+MAX_ATTEMPTS = int(os.getenv("PHASE4_MAX_ATTEMPTS", "3"))
+
+def shard_for(key, shards):
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) % shards
+
+# --- 2. Queue ---
+# status: pending -> leased -> done (merged, then deleted) or back to pending / failed
+class WorkQueue:
+    def __init__(self, path=QUEUE_PATH, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Autocommit, with explicit BEGIN IMMEDIATE where a read and a write must be atomic
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                seq INTEGER PRIMARY KEY,
+                item_key TEXT NOT NULL UNIQUE,
+                shard INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS items_status ON items (status, shard, seq);
+        """)
+
+    # Adds items as (key, record) pairs; keys already queued are ignored. Returns how many were added.
+    def enqueue(self, items, shards):
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            next_seq = self.connection.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM items").fetchone()[0]
+            added = 0
+            for key, record in items:
+                added += self.connection.execute(
+                    "INSERT OR IGNORE INTO items (seq, item_key, shard, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (next_seq + added, key, shard_for(key, shards), json.dumps(record, ensure_ascii=False), time.time()),
+                ).rowcount
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return added
+
+    # Leases up to `limit` items (pending, or with an expired lease) from the worker's own
+    # shard. Once that is empty it steals from the others, at most half of what is left so
+    # their owners keep some work. Returns [(seq, record)] in sequence order.
+    def lease(self, worker, limit, shard=None):
+        now = time.time()
+        available = "(status = 'pending' OR (status = 'leased' AND lease_expires < ?))"
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases that have used up their attempts are given up on
+            self.connection.execute("""
+                UPDATE items SET status = 'failed', updated_at = ?
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+            """, (now, now, self.max_attempts))
+            rows = []
+            if shard is not None:
+                rows = self.connection.execute(f"SELECT seq, payload FROM items WHERE {available} AND shard = ? "
+                                               "ORDER BY seq LIMIT ?", (now, shard, limit)).fetchall()
+            if not rows:
+                left = self.connection.execute(f"SELECT COUNT(*) FROM items WHERE {available}", (now,)).fetchone()[0]
+                steal = limit if shard is None else min(limit, max(1, left // 2))
+                rows = self.connection.execute(f"SELECT seq, payload FROM items WHERE {available} "
+                                               "ORDER BY seq LIMIT ?", (now, steal)).fetchall()
+            self.connection.executemany("""
+                UPDATE items SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+                WHERE seq = ?
+            """, [(worker, now + self.lease_seconds, now, seq) for seq, _ in rows])
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    # Heartbeat: pushes back the expiry of everything this worker holds
+    def renew(self, worker):
+        now = time.time()
+        self.connection.execute("UPDATE items SET lease_expires = ?, updated_at = ? WHERE status = 'leased' AND worker = ?",
+                                (now + self.lease_seconds, now, worker))
+
+    # `results` maps seq -> result (None for "analysed, nothing to keep"). Only items this
+    # worker still holds are updated: if its lease expired and someone else took over, the
+    # other worker's answer wins.
+    def complete(self, worker, results):
+        now = time.time()
+        self.connection.executemany("""
+            UPDATE items SET status = 'done', result = ?, lease_expires = NULL, updated_at = ?
+            WHERE seq = ? AND status = 'leased' AND worker = ?
+        """, [(None if result is None else json.dumps(result, ensure_ascii=False), now, seq, worker)
+              for seq, result in results.items()])
+
+    # Items whose analysis failed go back to the queue until they run out of attempts
+    def fail(self, worker, seqs):
+        now = time.time()
+        self.connection.executemany("""
+            UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                             lease_expires = NULL, updated_at = ?
+            WHERE seq = ? AND status = 'leased' AND worker = ?
+        """, [(self.max_attempts, now, seq, worker) for seq in seqs])
+
+    # A worker known to be dead (e.g. a child process that crashed): its items are free now
+    def release_worker(self, worker):
+        now = time.time()
+        return self.connection.execute("""
+            UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                             lease_expires = NULL, updated_at = ?
+            WHERE status = 'leased' AND worker = ?
+        """, (self.max_attempts, now, worker)).rowcount
+
+    def counts(self):
+        return dict(self.connection.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall())
+
+    def has_work(self):
+        counts = self.counts()
+        return counts.get("pending", 0) + counts.get("leased", 0) > 0
+
+    def done_by_worker(self):
+        return dict(self.connection.execute(
+            "SELECT worker, COUNT(*) FROM items WHERE status = 'done' GROUP BY worker ORDER BY worker").fetchall())
+
+    # Finished results in sequence order (i.e. raw_leads.jsonl order), whoever produced them
+    def done_results(self):
+        for seq, result in self.connection.execute(
+                "SELECT seq, result FROM items WHERE status = 'done' AND result IS NOT NULL ORDER BY seq"):
+            yield seq, json.loads(result)
+
+    # Deletes the items with this status (all of them with None)
+    def clear(self, status=None):
+        if status is None:
+            return self.connection.execute("DELETE FROM items").rowcount
+        return self.connection.execute("DELETE FROM items WHERE status = ?", (status,)).rowcount
+
+    def close(self):
+        self.connection.close()